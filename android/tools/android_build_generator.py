@@ -23,12 +23,19 @@
 
 import argparse
 import fileinput
+import itertools
 import json
 import os.path
-import re
+import sys
 
+import blueprint
+import build_cache
+import build_graph
+import build_profile
+import build_rules
 import make_parser
 import make_install_parser
+import make_native
 
 MAKE_DRY_RUN_FILE_NAME = 'make_dry_run.dump'
 MAKE_INSTALL_DRY_RUN_FILE_NAME = 'make_install_dry_run.dump'
@@ -41,34 +48,31 @@ class BuildGenerator(object):
     '''A class to parse make output and convert the result to Android.ltp.mk modules.
 
     Attributes:
-        _bp_result: directory of list of strings for blueprint file keyed by target name
+        _bp_result: directory of blueprint.Module keyed by target name, only
+            rendered to text by WriteAndroidBp
         _mk_result: directory of list of strings for makefile keyed by target name
         _custom_cflags: dict of string (module name) to lists of strings (cflags
             to add for said module)
         _unused_custom_cflags: set of strings; tracks the modules with custom
             cflags that we haven't yet seen
         _packages: list of strings of packages for package list file
+        _incremental_state: build_cache.IncrementalState of the previous run,
+            or None to generate everything from scratch
+        _parse_cache: build_cache.ParseCache of parsed dry-run dumps, or None
+            to always parse the dumps
+        _profiler: build_profile.Profiler timing the phases of the generation
     '''
 
-    def __init__(self, custom_cflags):
+    def __init__(self, custom_cflags, incremental_state=None,
+                 parse_cache=None, profiler=None):
         self._bp_result = {}
         self._mk_result = {}
         self._custom_cflags = custom_cflags
         self._unused_custom_cflags = set(custom_cflags)
         self._packages = []
-
-    def UniqueKeepOrder(self, sequence):
-        '''Get a copy of list where items are unique and order is preserved.
-
-        Args:
-          sequence: a sequence, can be a list, tuple, or other iterable
-
-        Returns:
-            a list where items copied from input sequence are unique
-            and order is preserved.
-        '''
-        seen = set()
-        return [x for x in sequence if not (x in seen or seen.add(x))]
+        self._incremental_state = incremental_state
+        self._parse_cache = parse_cache
+        self._profiler = profiler or build_profile.Profiler()
 
     def ReadCommentedText(self, file_path):
         '''Read pound commented text file into a list of lines.
@@ -85,6 +89,32 @@ class BuildGenerator(object):
 
         return ret
 
+    def LookupModule(self, name, inputs):
+        '''Get the module generated for unchanged inputs in a previous run.
+
+        Args:
+            name: string, module name
+            inputs: list, everything the module is generated from
+
+        Returns:
+            blueprint.Module or list of string (makefile lines), or None if
+            the module has to be generated
+        '''
+        if self._incremental_state is None:
+            return None
+        return self._incremental_state.LookupModule(name, inputs)
+
+    def StoreModule(self, name, inputs, module):
+        '''Record the module generated for its inputs for later runs.
+
+        Args:
+            name: string, module name
+            inputs: list, as passed to LookupModule
+            module: blueprint.Module or list of string (makefile lines)
+        '''
+        if self._incremental_state is not None:
+            self._incremental_state.StoreModule(name, inputs, module)
+
     def ArTargetToLibraryName(self, ar_target):
         '''Convert ar target to library name.
 
@@ -122,66 +152,39 @@ class BuildGenerator(object):
         # ltp_defaults already adds the include directory
         local_c_includes = [i for i in local_c_includes if i != 'include']
         target_name = 'ltp_%s' % base_name
-        target_bp = []
 
         self._packages.append(target_name)
 
-        target_bp.append('cc_test {')
-        target_bp.append('    name: "%s",' % target_name)
-        target_bp.append('    stem: "%s",' % base_name)
-        target_bp.append('    defaults: ["ltp_test_defaults"],')
-
-        if len(local_src_files) == 1:
-            target_bp.append('    srcs: ["%s"],' % list(local_src_files)[0])
-        else:
-            target_bp.append('    srcs: [')
-            for src in local_src_files:
-                target_bp.append('        "%s",' % src)
-            target_bp.append('    ],')
-
-        if len(local_cflags) == 1:
-            target_bp.append('    cflags: ["%s"],' % list(local_cflags)[0])
-        elif len(local_cflags) > 1:
-            target_bp.append('    cflags: [')
-            for cflag in local_cflags:
-                target_bp.append('        "%s",' % cflag)
-            target_bp.append('    ],')
-
-        if len(local_c_includes) == 1:
-            target_bp.append('    local_include_dirs: ["%s"],' % list(local_c_includes)[0])
-        elif len(local_c_includes) > 1:
-            target_bp.append('    local_include_dirs: [')
-            for d in local_c_includes:
-                target_bp.append('        "%s",' % d)
-            target_bp.append('    ],')
-
         bionic_builtin_libs = set(['m', 'rt', 'pthread', 'util'])
         filtered_libs = set(local_libraries).difference(bionic_builtin_libs)
 
         static_libraries = set(i for i in local_libraries if i in ltp_libs)
-        if len(static_libraries) == 1:
-            target_bp.append('    static_libs: ["libltp_%s"],' % list(static_libraries)[0])
-        elif len(static_libraries) > 1:
-            target_bp.append('    static_libs: [')
-            for lib in static_libraries:
-                target_bp.append('        "libltp_%s",' % lib)
-            target_bp.append('    ],')
-
         for lib in static_libraries:
             ltp_libs_used.add(lib)
 
         shared_libraries = set(i for i in filtered_libs if i not in ltp_libs)
-        if len(shared_libraries) == 1:
-            target_bp.append('    shared_libs: ["lib%s"],' % list(shared_libraries)[0])
-        elif len(shared_libraries) > 1:
-            target_bp.append('    shared_libs: [')
-            for lib in shared_libraries:
-                target_bp.append('        "lib%s",' % lib)
-            target_bp.append('    ],')
-
-        target_bp.append('}')
-        target_bp.append('')
+
+        inputs = ['cc_test', base_name, list(local_src_files),
+                  list(local_cflags), local_c_includes,
+                  list(static_libraries), list(shared_libraries)]
+        target_bp = self.LookupModule(target_name, inputs)
+        if target_bp is not None:
+            self._bp_result[target_name] = target_bp
+            return
+
+        target_bp = blueprint.Module('cc_test')
+        target_bp.AddString('name', target_name)
+        target_bp.AddString('stem', base_name)
+        target_bp.AddList('defaults', ['ltp_test_defaults'])
+        target_bp.AddList('srcs', local_src_files, required=True)
+        target_bp.AddList('cflags', local_cflags)
+        target_bp.AddList('local_include_dirs', local_c_includes)
+        target_bp.AddList('static_libs',
+                          ('libltp_%s' % i for i in static_libraries))
+        target_bp.AddList('shared_libs',
+                          ('lib%s' % i for i in shared_libraries))
         self._bp_result[target_name] = target_bp
+        self.StoreModule(target_name, inputs, target_bp)
 
     def BuildStaticLibrary(self, ar_target, local_src_files, local_cflags,
                            local_c_includes):
@@ -194,31 +197,23 @@ class BuildGenerator(object):
             local_c_includes: list of string
         '''
         target_name = 'libltp_%s' % self.ArTargetToLibraryName(ar_target)
-        target_bp = []
-        target_bp.append('cc_library_static {')
-        target_bp.append('    name: "%s",' % target_name)
-        target_bp.append('    defaults: ["ltp_defaults"],')
-
-        if len(local_c_includes):
-            target_bp.append('    local_include_dirs: [')
-            for d in local_c_includes:
-                target_bp.append('        "%s",' % d)
-            target_bp.append('    ],')
-
-        if len(local_cflags):
-            target_bp.append('    cflags: [')
-            for cflag in local_cflags:
-                target_bp.append('        "%s",' % cflag)
-            target_bp.append('    ],')
-
-        target_bp.append('    srcs: [')
-        for src in local_src_files:
-            target_bp.append('        "%s",' % src)
-        target_bp.append('    ],')
-
-        target_bp.append('}')
-        target_bp.append('')
+        inputs = ['cc_library_static', list(local_src_files),
+                  list(local_cflags), list(local_c_includes)]
+        target_bp = self.LookupModule(target_name, inputs)
+        if target_bp is not None:
+            self._bp_result[target_name] = target_bp
+            return
+
+        target_bp = blueprint.Module('cc_library_static')
+        target_bp.AddString('name', target_name)
+        target_bp.AddList('defaults', ['ltp_defaults'])
+        target_bp.AddList('local_include_dirs', local_c_includes,
+                          blueprint.EXPANDED)
+        target_bp.AddList('cflags', local_cflags, blueprint.EXPANDED)
+        target_bp.AddList('srcs', local_src_files, blueprint.EXPANDED,
+                          required=True)
         self._bp_result[target_name] = target_bp
+        self.StoreModule(target_name, inputs, target_bp)
 
     def BuildShellScript(self, install_target, local_src_file):
         '''Build a shell script.
@@ -228,24 +223,28 @@ class BuildGenerator(object):
             local_src_file: string
         '''
         base_name = os.path.basename(install_target)
-        bp_result = []
 
         module = 'ltp_%s' % install_target.replace('/', '_')
         self._packages.append(module)
 
+        inputs = ['sh_test', install_target, local_src_file]
+        bp_result = self.LookupModule(module, inputs)
+        if bp_result is not None:
+            self._bp_result[module] = bp_result
+            return
+
         module_dir = os.path.dirname(install_target)
         module_stem = os.path.basename(install_target)
 
-        bp_result.append('sh_test {')
-        bp_result.append('    name: "%s",' % module)
-        bp_result.append('    src: "%s",' % local_src_file)
-        bp_result.append('    sub_dir: "ltp/%s",' % module_dir)
-        bp_result.append('    filename: "%s",' % module_stem)
-        bp_result.append('    compile_multilib: "both",')
-        bp_result.append('}')
-        bp_result.append('')
+        bp_result = blueprint.Module('sh_test')
+        bp_result.AddString('name', module)
+        bp_result.AddString('src', local_src_file)
+        bp_result.AddString('sub_dir', 'ltp/%s' % module_dir)
+        bp_result.AddString('filename', module_stem)
+        bp_result.AddString('compile_multilib', 'both')
 
         self._bp_result[module] = bp_result
+        self.StoreModule(module, inputs, bp_result)
 
     def BuildPrebuilt(self, install_target, local_src_file):
         '''Build a prebuild module.
@@ -255,184 +254,87 @@ class BuildGenerator(object):
             local_src_file: string
         '''
         base_name = os.path.basename(install_target)
-        mk_result = []
-        mk_result.append('module_prebuilt := %s' % install_target)
-        mk_result.append('module_src_files := %s' % local_src_file)
         module_dir = os.path.dirname(install_target)
         module_stem = os.path.basename(install_target)
         module = 'ltp_%s' % install_target.replace('/', '_')
         self._packages.append(module)
 
+        inputs = ['module_prebuilt', install_target, local_src_file]
+        mk_result = self.LookupModule(module, inputs)
+        if mk_result is not None:
+            self._mk_result[base_name] = mk_result
+            return
+        mk_result = []
+        mk_result.append('module_prebuilt := %s' % install_target)
+        mk_result.append('module_src_files := %s' % local_src_file)
         mk_result.append('include $(ltp_build_prebuilt)')
         mk_result.append('')
         self._mk_result[base_name] = mk_result
+        self.StoreModule(module, inputs, mk_result)
 
-    def HandleParsedRule(self, line, rules):
-        '''Prepare parse rules.
-
-        Args:
-            line: string
-            rules: dictionary {string, dictionary}
-        '''
-        groups = re.match(r'(.*)\[\'(.*)\'\] = \[(.*)\]', line).groups()
-        rule = groups[0]
-        rule_key = groups[1]
-        if groups[2] == '':
-            rule_value = []
-        else:
-            rule_value = list(i.strip()[1:-1] for i in groups[2].split(','))
-
-        rule_value = self.UniqueKeepOrder(rule_value)
-        rules.setdefault(rule, {})[rule_key] = rule_value
-
-    def ParseInput(self, input_list, ltp_root):
-        '''Parse a interpreted make output and produce Android.ltp.mk module.
+    def ParseInput(self, rule_set, ltp_root):
+        '''Parse make output rules and produce Android.ltp.mk module.
 
         Args:
-            input_list: list of string
+            rule_set: build_rules.RuleSet
+            ltp_root: string
         '''
         disabled_tests = self.ReadCommentedText(DISABLED_TESTS_FILE_NAME)
         disabled_libs = self.ReadCommentedText(DISABLED_LIBS_FILE_NAME)
         disabled_cflags = self.ReadCommentedText(DISABLED_CFLAGS_FILE_NAME)
 
-        rules = {}
-        for line in input_list:
-            self.HandleParsedRule(line.strip(), rules)
-
-        # .a target -> .o files
-        ar = rules.get('ar', {})
-        # executable target -> .o files
-        cc_link = rules.get('cc_link', {})
-        # .o target -> .c file
-        cc_compile = rules.get('cc_compile', {})
-        # executable target -> .c files
-        cc_compilelink = rules.get('cc_compilelink', {})
-        # Target name -> CFLAGS passed to gcc
-        cc_flags = rules.get('cc_flags', {})
-        # Target name -> -I paths passed to gcc
-        cc_includes = rules.get('cc_includes', {})
-        # Target name -> -l paths passed to gcc
-        cc_libraries = rules.get('cc_libraries', {})
-        # target -> prebuilt source
-        install = rules.get('install', {})
+        # target -> InstallRule of a prebuilt source
+        install = rule_set.install
+        # Every target built by gcc
+        cc_rules = (rule_set.cc_compile, rule_set.cc_link,
+                    rule_set.cc_compilelink)
 
         # All libraries used by any LTP test (built or not)
-        ltp_libs = set(self.ArTargetToLibraryName(i) for i in ar.keys())
+        ltp_libs = set(self.ArTargetToLibraryName(i) for i in rule_set.ar)
         # All libraries used by the LTP tests we actually build
         ltp_libs_used = set()
         ltp_names_used = set()
 
         # Remove -Wno-error from cflags, we don't want to print warnings.
         # Silence individual warnings in ltp_defaults or fix them.
-        for target in cc_flags:
-            if '-Wno-error' in cc_flags[target]:
-                cc_flags[target].remove('-Wno-error')
-
-        print(
-            "Disabled lib tests: Test cases listed here are"
-            "suggested to be disabled since they require a disabled library. "
-            "Please copy and paste them into disabled_tests.txt\n")
-        for i in cc_libraries:
-            if len(set(cc_libraries[i]).intersection(disabled_libs)) > 0:
-                if not os.path.basename(i) in disabled_tests:
-                    print os.path.basename(i)
-
-        print("Disabled_cflag tests: Test cases listed here are"
-              "suggested to be disabled since they require a disabled cflag. "
-              "Please copy and paste them into disabled_tests.txt\n")
-        for i in cc_flags:
-            if len(set(cc_flags[i]).intersection(disabled_cflags)) > 0:
-                module_name = os.path.basename(i)
-                idx = module_name.find('_')
-                if idx > 0:
-                    module_name = module_name[:idx]
-                print module_name
+        for rules in cc_rules:
+            for rule in rules.itervalues():
+                if '-Wno-error' in rule.flags:
+                    rule.flags.remove('-Wno-error')
 
         # Remove include directories that don't exist. They're an error in
         # Soong.
-        for target in cc_includes:
-            cc_includes[target] = [i for i in cc_includes[target] if os.path.isdir(os.path.join(ltp_root, i))]
-
-        for target in cc_compilelink:
-            module_name = os.path.basename(target)
-            if module_name in disabled_tests:
-                continue
-            local_src_files = []
-            src_files = cc_compilelink[target]
-            for i in src_files:
-                # some targets may have a mix of .c and .o files in srcs
-                # find the .c files to build those .o from cc_compile targets
-                if i.endswith('.o'):
-                    local_src_files.extend(cc_compile[i])
-                else:
-                    local_src_files.append(i)
-            local_cflags = cc_flags[target]
-            local_c_includes = cc_includes[target]
-            local_libraries = cc_libraries[target]
-            if len(set(local_libraries).intersection(disabled_libs)) > 0:
-                continue
-            if len(set(local_cflags).intersection(disabled_cflags)) > 0:
-                continue
-            self.BuildExecutable(target, local_src_files, local_cflags,
-                                 local_c_includes, local_libraries, ltp_libs,
-                                 ltp_libs_used, ltp_names_used)
-
-        for target in cc_link:
-            if os.path.basename(target) in disabled_tests:
-                continue
-            local_src_files = set()
-            local_cflags = set()
-            local_c_includes = set()
-            local_libraries = cc_libraries[target]
-            # Accumulate flags for all .c files needed to build the .o files.
-            # (Android.mk requires a consistent set of flags across a given target.
-            # Thankfully using the superset of all flags in the target works fine
-            # with LTP tests.)
-            for obj in cc_link[target]:
-                for i in cc_compile[obj]:
-                    local_src_files.add(i)
-                for i in cc_flags[obj]:
-                    local_cflags.add(i)
-                for i in cc_includes[obj]:
-                    local_c_includes.add(i)
-            if len(set(local_libraries).intersection(disabled_libs)) > 0:
-                continue
-            if len(set(local_cflags).intersection(disabled_cflags)) > 0:
+        for rules in cc_rules:
+            for rule in rules.itervalues():
+                rule.includes = [i for i in rule.includes if os.path.isdir(os.path.join(ltp_root, i))]
+
+        graph = build_graph.DependencyGraph(rule_set,
+                                            self.ArTargetToLibraryName)
+        graph.Resolve(disabled_tests, disabled_libs, disabled_cflags)
+
+        fallout = graph.Fallout()
+        if fallout:
+            print("Tests not built because they require a disabled library "
+                  "or cflag (see disabled_libs.txt and disabled_cflags.txt):")
+            for target, reason in fallout:
+                print '  %s: %s' % (os.path.basename(target), reason)
+
+        for node in graph.Nodes(build_graph.EXECUTABLE):
+            if node.disabled:
                 continue
-
-            self.BuildExecutable(target, local_src_files, local_cflags,
-                                 local_c_includes, local_libraries, ltp_libs,
+            self.BuildExecutable(node.target, node.sources, node.cflags,
+                                 node.includes, node.libraries, ltp_libs,
                                  ltp_libs_used, ltp_names_used)
 
-        for target in ar:
-            # Disabled ltp library is already excluded
-            # since it won't be in ltp_libs_used
-            if not self.ArTargetToLibraryName(target) in ltp_libs_used:
+        for node in graph.Nodes(build_graph.LIBRARY):
+            # Libraries not used by any test we build are skipped
+            if not self.ArTargetToLibraryName(node.target) in ltp_libs_used:
                 continue
-
-            local_src_files = set()
-            local_cflags = set()
-            local_c_includes = set()
-
-            # TODO: disabled cflags
-
-            for obj in ar[target]:
-                for i in cc_compile[obj]:
-                    local_src_files.add(i)
-                for i in cc_flags[obj]:
-                    local_cflags.add(i)
-                for i in cc_includes[obj]:
-                    local_c_includes.add(i)
-
-            if len(set(local_cflags).intersection(disabled_cflags)) > 0:
+            if node.disabled:
                 continue
 
-            local_src_files = sorted(local_src_files)
-            local_cflags = sorted(local_cflags)
-            local_c_includes = sorted(local_c_includes)
-
-            self.BuildStaticLibrary(target, local_src_files, local_cflags,
-                                    local_c_includes)
+            self.BuildStaticLibrary(node.target, node.sources, node.cflags,
+                                    node.includes)
 
         for target in install:
             # Check if the absolute path to the prebuilt (relative to LTP_ROOT)
@@ -448,13 +350,12 @@ class BuildGenerator(object):
                 continue
             if os.path.basename(target) in disabled_tests:
                 continue
-            local_src_files = install[target]
-            assert len(local_src_files) == 1
+            local_src_file = install[target].source
 
             if target.startswith("testcases/bin/"):
-                self.BuildShellScript(target, local_src_files[0])
+                self.BuildShellScript(target, local_src_file)
             else:
-                self.BuildPrebuilt(target, local_src_files[0])
+                self.BuildPrebuilt(target, local_src_file)
 
     def WriteAndroidBp(self, output_path):
         '''Write parse result to blueprint file.
@@ -462,10 +363,9 @@ class BuildGenerator(object):
         Args:
             output_path: string
         '''
-        with open(output_path, 'a') as f:
-            for k in sorted(self._bp_result.iterkeys()):
-                f.write('\n'.join(self._bp_result[k]))
-                f.write('\n')
+        with self._profiler.Phase('WriteAndroidBp') as counters:
+            counters['modules'] = len(self._bp_result)
+            blueprint.WriteModules(output_path, self._bp_result)
             self._bp_result = {}
 
     def WriteAndroidMk(self, output_path):
@@ -474,7 +374,9 @@ class BuildGenerator(object):
         Args:
             output_path: string
         '''
-        with open(output_path, 'a') as f:
+        with self._profiler.Phase('WriteAndroidMk') as counters, \
+                open(output_path, 'a') as f:
+            counters['modules'] = len(self._mk_result)
             for k in sorted(self._mk_result.iterkeys()):
                 f.write('\n'.join(self._mk_result[k]))
                 f.write('\n')
@@ -486,21 +388,70 @@ class BuildGenerator(object):
         Args:
             output_path: string
         '''
-        with open(output_path, 'a') as f:
+        with self._profiler.Phase('WritePackageList') as counters, \
+                open(output_path, 'a') as f:
+            counters['packages'] = len(self._packages)
             f.write('ltp_packages := \\\n  ')
             f.write(' \\\n  '.join(sorted(self._packages)))
             self._packages = []
 
-    def ParseAll(self, ltp_root):
+    def ParseDump(self, parser, input_path, jobs):
+        '''Parse a dry-run dump.
+
+        Args:
+            parser: make_parser.MakeParser or
+                make_install_parser.MakeInstallParser
+            input_path: string, path to the dry-run dump
+            jobs: int, number of processes to parse the dump with
+
+        Returns:
+            iterable of rules, in the order they appear in the dump
+        '''
+        if self._incremental_state is not None:
+            return self._incremental_state.IterRules(parser, input_path, jobs)
+        if jobs > 1:
+            sections = list(make_parser.SplitSections(input_path))
+            return itertools.chain.from_iterable(
+                make_parser.ParseSections(parser, sections, jobs))
+        return parser.IterRules(input_path)
+
+    def ParseAll(self, ltp_root, jobs=1):
         '''Parse outputs from both 'make' and 'make install'.
 
         Args:
             ltp_root: string
+            jobs: int, number of processes to parse the outputs with
+
+        Returns:
+            build_rules.RuleSet, the parsed rules
         '''
-        parser = make_parser.MakeParser(ltp_root)
-        self.ParseInput(parser.ParseFile(MAKE_DRY_RUN_FILE_NAME), ltp_root)
-        parser = make_install_parser.MakeInstallParser(ltp_root)
-        self.ParseInput(parser.ParseFile(MAKE_INSTALL_DRY_RUN_FILE_NAME), ltp_root)
+        rule_set = build_rules.RuleSet()
+        for parser, input_path in (
+                (make_parser.MakeParser(ltp_root), MAKE_DRY_RUN_FILE_NAME),
+                (make_install_parser.MakeInstallParser(ltp_root),
+                 MAKE_INSTALL_DRY_RUN_FILE_NAME)):
+            with self._profiler.Phase(type(parser).__name__) as counters:
+                counters['lines'] = build_profile.CountLines(input_path)
+                rules = None
+                if self._parse_cache is not None:
+                    key = self._parse_cache.Key(parser, input_path)
+                    rules = self._parse_cache.Load(key)
+                    counters['parse_cache_hit'] = rules is not None
+                if rules is not None:
+                    if self._incremental_state is not None:
+                        self._incremental_state.KeepSections(parser)
+                else:
+                    rules = list(self.ParseDump(parser, input_path, jobs))
+                    if self._parse_cache is not None:
+                        self._parse_cache.Store(key, rules)
+                rule_set.Extend(rules)
+                counters['rules'] = len(rules)
+                counters.update(build_profile.ParserCounters(parser))
+        with self._profiler.Phase('ParseInput') as counters:
+            counters['rules'] = sum(1 for _ in rule_set.Rules())
+            self.ParseInput(rule_set, ltp_root)
+            counters['modules'] = len(self._bp_result) + len(self._mk_result)
+        return rule_set
 
     def GetUnusedCustomCFlagsTargets(self):
         '''Get targets that have custom cflags, but that weren't built.'''
@@ -531,6 +482,51 @@ def main():
         dest='custom_cflags_file',
         required=True,
         help='file with custom per-module cflags. empty means no file.')
+    parser.add_argument(
+        '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='number of processes to parse the dry-run dumps with')
+    parser.add_argument(
+        '--incremental_state',
+        dest='incremental_state',
+        help='state file of a previous run. Only the dump sections and '
+             'modules that changed since are processed again, and the file '
+             'is updated for the next run.')
+    parser.add_argument(
+        '--parse_cache_dir',
+        dest='parse_cache_dir',
+        help='directory caching the rules parsed from the dry-run dumps. '
+             'Dumps that did not change since they were cached are not '
+             'parsed again.')
+    parser.add_argument(
+        '--invalidate_parse_cache',
+        dest='invalidate_parse_cache',
+        action='store_true',
+        help='empty the parse cache before parsing')
+    parser.add_argument(
+        '--dump_rules',
+        dest='dump_rules',
+        help='also write the parsed rules in text form to this path, '
+             'for debugging')
+    parser.add_argument(
+        '--native',
+        dest='native',
+        action='store_true',
+        help='dump the make dry-runs on the host with make_native instead of '
+             'using the dumps made in docker. ltp_root must be configured.')
+    parser.add_argument(
+        '--profile',
+        dest='profile',
+        help='write a JSON report of the wall time, CPU time, peak RSS, '
+             'lines and rules of every phase to this path')
+    parser.add_argument(
+        '--profile_dry_run_seconds',
+        dest='profile_dry_run_seconds',
+        type=float,
+        help='wall time of the make dry-runs, timed by the caller, to include '
+             'in the profile report')
     args = parser.parse_args()
 
     custom_cflags = {}
@@ -540,8 +536,38 @@ def main():
         with open(args.custom_cflags_file) as f:
             custom_cflags = json.load(f)
 
-    generator = BuildGenerator(custom_cflags)
-    generator.ParseAll(args.ltp_root)
+    incremental_state = None
+    if args.incremental_state:
+        incremental_state = build_cache.IncrementalState.Load(
+            args.incremental_state, args.ltp_root)
+
+    parse_cache = None
+    if args.parse_cache_dir:
+        parse_cache = build_cache.ParseCache(args.parse_cache_dir,
+                                             args.ltp_root)
+        if args.invalidate_parse_cache:
+            parse_cache.Invalidate()
+
+    profiler = build_profile.Profiler()
+    if args.profile_dry_run_seconds is not None:
+        profiler.AddPhase('DryRun', args.profile_dry_run_seconds)
+    if args.native:
+        if not make_native.IsConfigured(args.ltp_root):
+            sys.exit('%s is not configured, run "make autotools; ./configure" '
+                     'in it first' % args.ltp_root)
+        with profiler.Phase('NativeDryRun') as counters:
+            dry_run = make_native.NativeDryRun(args.ltp_root, args.jobs)
+            dry_run.Run(MAKE_DRY_RUN_FILE_NAME, MAKE_INSTALL_DRY_RUN_FILE_NAME)
+            counters['directories'] = dry_run.directories
+            counters['make_calls'] = dry_run.make_calls
+
+    generator = BuildGenerator(custom_cflags, incremental_state, parse_cache,
+                               profiler)
+    rule_set = generator.ParseAll(args.ltp_root, args.jobs)
+    if args.dump_rules:
+        with open(args.dump_rules, 'w') as f:
+            f.write('\n'.join(rule_set.Directives()))
+            f.write('\n')
     generator.WriteAndroidMk(args.output_mk_path)
     generator.WriteAndroidBp(args.output_bp_path)
     generator.WritePackageList(args.output_plist_path)
@@ -551,6 +577,15 @@ def main():
         print 'NOTE: Tests had custom cflags, but were never seen: {}'.format(
             ', '.join(unused_cflags_targs))
 
+    if incremental_state is not None:
+        incremental_state.Save(args.incremental_state)
+        print incremental_state.Summary()
+    if parse_cache is not None:
+        print parse_cache.Summary()
+    if args.profile:
+        profiler.Write(args.profile)
+        print profiler.Summary()
+
     print 'Finished!'
 
 
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Benchmark of make_parser, make_install_parser and android_build_generator
+# on a synthetic LTP tree, so that changes to the generator can be measured
+# without a docker build of the real tree.
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+
+import android_build_generator
+import build_profile
+
+# Flags drawn from when synthesizing compile commands, roughly in the
+# proportions found in the real dumps.
+COMMON_CFLAGS = ['-g', '-O2', '-fno-strict-aliasing', '-pipe', '-Wall',
+                 '-W', '-Wold-style-definition']
+OPTIONAL_CFLAGS = ['-D_GNU_SOURCE', '-D_FILE_OFFSET_BITS=64', '-DLINUX',
+                   '-DHAVE_CONFIG_H', '-Wno-unused', '-Wno-error',
+                   '-fno-builtin', '-DTST_USE_NEWER64_SYSCALL=1']
+SYSTEM_LIBRARIES = ['pthread', 'rt', 'm', 'dl']
+
+
+class SyntheticTree(object):
+    '''A synthetic LTP tree with the dry-run dumps of its build.
+
+    Attributes:
+        ltp_root: string, root of the tree
+        work_dir: string, directory holding the dumps and the disabled_*.txt
+            files, the generator has to run from there
+        make_lines: int, number of lines of the make dump
+        install_lines: int, number of lines of the make install dump
+    '''
+
+    def __init__(self, base_dir, directories, tests, libraries,
+                 seed=0):
+        '''Create the tree and its dumps.
+
+        Args:
+            base_dir: string, directory to create the tree in
+            directories: int, number of test directories
+            tests: int, number of tests per directory
+            libraries: int, number of static libraries shared by the tests
+            seed: int, seed of the flag and library distributions
+        '''
+        self.ltp_root = os.path.join(base_dir, 'ltp')
+        self.work_dir = os.path.join(base_dir, 'work')
+        os.makedirs(self.work_dir)
+        for name in (android_build_generator.DISABLED_TESTS_FILE_NAME,
+                     android_build_generator.DISABLED_LIBS_FILE_NAME,
+                     android_build_generator.DISABLED_CFLAGS_FILE_NAME):
+            open(os.path.join(self.work_dir, name), 'w').close()
+
+        rand = random.Random(seed)
+        make_dump = []
+        install_dump = []
+        self._Enter(make_dump, 'testcases')
+
+        library_names = []
+        for i in range(libraries):
+            name = 'bench%d' % i
+            library_names.append(name)
+            directory = 'libs/lib%s' % name
+            self._Enter(make_dump, directory)
+            objects = []
+            for j in range(rand.randint(2, 8)):
+                source = '%s_%d.c' % (name, j)
+                self._Touch(directory, source)
+                objects.append(source[:-2] + '.o')
+                make_dump.append('gcc %s -c -o %s %s' % (
+                    self._CFlags(rand, 4, ['-DLTPLIB']), objects[-1], source))
+            make_dump.append('ar -rc "lib%s.a" %s' % (name, ' '.join(objects)))
+            make_dump.append('ranlib "lib%s.a"' % name)
+            self._Leave(make_dump, directory)
+
+        for i in range(directories):
+            directory = 'testcases/kernel/bench/dir%04d' % i
+            self._Enter(make_dump, directory)
+            self._Enter(install_dump, directory)
+            depth = '/'.join(['..'] * len(directory.split('/')))
+            for j in range(tests):
+                test = 'bench%04d_%02d' % (i, j)
+                libs = (rand.sample(library_names,
+                                    min(len(library_names),
+                                        rand.randint(0, 2))) +
+                        rand.sample(SYSTEM_LIBRARIES, rand.randint(0, 2)))
+                link = ' '.join('-l%s' % lib for lib in libs)
+                if rand.random() < 0.1:
+                    script = test + '.sh'
+                    self._Touch(directory, script)
+                    install_dump.append(
+                        'install -m 00775 "%s/%s/%s" '
+                        '"/opt/ltp/testcases/bin/%s"' % (
+                            self.ltp_root, directory, script, script))
+                    continue
+                self._Touch(directory, test + '.c')
+                cflags = self._CFlags(rand, 5, ['-I%s/include' % depth])
+                if rand.random() < 0.3:
+                    make_dump.append('gcc %s -c -o %s.o %s.c' % (
+                        cflags, test, test))
+                    make_dump.append('gcc -L%s/lib %s.o %s -o %s' % (
+                        depth, test, link, test))
+                else:
+                    make_dump.append('gcc %s -L%s/lib %s.c %s -o %s' % (
+                        cflags, depth, test, link, test))
+                install_dump.append(
+                    'install -m 00775 "%s/%s/%s" '
+                    '"/opt/ltp/testcases/bin/%s"' % (
+                        self.ltp_root, directory, test, test))
+            self._Leave(install_dump, directory)
+            self._Leave(make_dump, directory)
+
+        self._Leave(make_dump, 'testcases')
+        self.make_lines = self._WriteDump(
+            android_build_generator.MAKE_DRY_RUN_FILE_NAME, make_dump)
+        self.install_lines = self._WriteDump(
+            android_build_generator.MAKE_INSTALL_DRY_RUN_FILE_NAME,
+            install_dump)
+
+    def _Enter(self, dump, directory):
+        dump.append("make: Entering directory '%s/%s'" % (self.ltp_root,
+                                                          directory))
+
+    def _Leave(self, dump, directory):
+        dump.append("make: Leaving directory '%s/%s'" % (self.ltp_root,
+                                                         directory))
+
+    def _Touch(self, directory, name):
+        path = os.path.join(self.ltp_root, directory)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        open(os.path.join(path, name), 'w').close()
+
+    def _CFlags(self, rand, max_optional, extra):
+        return ' '.join(extra + COMMON_CFLAGS +
+                        rand.sample(OPTIONAL_CFLAGS,
+                                    rand.randint(0, max_optional)))
+
+    def _WriteDump(self, name, lines):
+        with open(os.path.join(self.work_dir, name), 'w') as f:
+            f.write('\n'.join(lines))
+            f.write('\n')
+        return len(lines)
+
+
+def RunGenerator(tree, jobs):
+    '''Run the generator on a synthetic tree.
+
+    Args:
+        tree: SyntheticTree
+        jobs: int, number of processes to parse the dumps with
+
+    Returns:
+        build_profile.Profiler with the phases of the run
+    '''
+    profiler = build_profile.Profiler()
+    cwd = os.getcwd()
+    os.chdir(tree.work_dir)
+    try:
+        generator = android_build_generator.BuildGenerator(
+            {}, profiler=profiler)
+        generator.ParseAll(tree.ltp_root, jobs)
+        generator.WriteAndroidMk(os.path.join(tree.work_dir, 'Android.ltp.mk'))
+        generator.WriteAndroidBp(os.path.join(tree.work_dir, 'gen.bp'))
+        generator.WritePackageList(
+            os.path.join(tree.work_dir, 'ltp_package_list.mk'))
+    finally:
+        os.chdir(cwd)
+    return profiler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Android build generator on a synthetic '
+                    'LTP tree')
+    parser.add_argument(
+        '--directories', type=int, default=200,
+        help='number of test directories')
+    parser.add_argument(
+        '--tests', type=int, default=10,
+        help='number of tests per directory')
+    parser.add_argument(
+        '--libraries', type=int, default=5,
+        help='number of static libraries shared by the tests')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='seed of the flag and library distributions')
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help='number of processes to parse the dumps with')
+    parser.add_argument(
+        '--iterations', type=int, default=3,
+        help='number of runs, the fastest one is reported')
+    parser.add_argument(
+        '--output', help='also write the report of the fastest run as JSON')
+    parser.add_argument(
+        '--keep', action='store_true',
+        help='keep the synthetic tree and the generated files')
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix='ltp_bench_')
+    try:
+        tree = SyntheticTree(base_dir, args.directories, args.tests,
+                             args.libraries, args.seed)
+        print 'Synthetic tree in %s: %d make lines, %d make install lines' % (
+            base_dir, tree.make_lines, tree.install_lines)
+
+        best = None
+        first = None
+        for _ in range(args.iterations):
+            # Outputs are appended to, like gen_android_build.sh does after
+            # writing the license header.
+            for name in ('Android.ltp.mk', 'gen.bp', 'ltp_package_list.mk'):
+                open(os.path.join(tree.work_dir, name), 'w').close()
+            report = RunGenerator(tree, args.jobs).Report()
+            if first is None:
+                first = report
+            if (best is None or report['total']['wall_seconds'] <
+                    best['total']['wall_seconds']):
+                best = report
+
+        print '%-18s %9s %9s %12s %10s %12s' % (
+            'phase', 'wall (s)', 'cpu (s)', 'lines/s', 'rules', '+rss (KB)')
+        # Later runs reuse the memory of the first one, which is the only
+        # one raising the peak RSS of the process.
+        for phase, first_phase in zip(best['phases'], first['phases']):
+            lines = phase.get('lines')
+            print '%-18s %9.3f %9.3f %12s %10s %12d' % (
+                phase['name'], phase['wall_seconds'], phase['cpu_seconds'],
+                '-' if lines is None else
+                '%.0f' % (lines / max(phase['wall_seconds'], 1e-9)),
+                phase.get('rules', '-'),
+                first_phase['rss_increase_kb'])
+        total = best['total']
+        print 'total: %.3fs wall, %.3fs cpu, %d KB peak RSS, %.0f lines/s' % (
+            total['wall_seconds'], total['cpu_seconds'],
+            total['rss_high_water_kb'],
+            (tree.make_lines + tree.install_lines) /
+            max(total['wall_seconds'], 1e-9))
+
+        if args.output:
+            best['tree'] = {
+                'directories': args.directories,
+                'tests': args.tests,
+                'libraries': args.libraries,
+                'seed': args.seed,
+                'make_lines': tree.make_lines,
+                'install_lines': tree.install_lines,
+            }
+            with open(args.output, 'w') as f:
+                json.dump(best, f, indent=2, sort_keys=True)
+                f.write('\n')
+    finally:
+        if args.keep:
+            print 'Kept %s' % base_dir
+        else:
+            shutil.rmtree(base_dir)
+
+
+if __name__ == '__main__':
+    main()
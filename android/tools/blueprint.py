@@ -0,0 +1,252 @@
+#
+# Copyright 2016 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Blueprint (Android.bp) modules as generated into gen.bp.
+
+import re
+
+# Size of the write buffer used by WriteModules.
+WRITE_BUFFER_SIZE = 1 << 20
+
+# How list properties are rendered:
+#   COMPACT: a single value on the property line, more values one per line,
+#       omitted when empty
+#   EXPANDED: always one value per line, omitted when empty
+COMPACT = 'compact'
+EXPANDED = 'expanded'
+
+# Tokens of the blueprint syntax written by Module.Write, separated by
+# whitespace: comments, strings, punctuation and identifiers. Anything else
+# is a syntax error.
+WHITESPACE = re.compile(r'\s*')
+TOKEN = re.compile(r'(?://[^\n]*|("(?:[^"\\\n]|\\.)*")|([{}\[\]:,])|'
+                   r'([A-Za-z_][A-Za-z0-9_]*))')
+
+
+class Module(object):
+    '''A blueprint module.
+
+    Properties are only rendered to text when the module is written.
+
+    Attributes:
+        module_type: string, e.g. 'cc_test'
+        properties: list of (name, value, style, required) tuples, in output
+            order. value is a string or a list of strings. style is COMPACT
+            or EXPANDED for lists. Empty lists are written anyway when
+            required is True.
+    '''
+    __slots__ = ('module_type', 'properties')
+
+    def __init__(self, module_type):
+        self.module_type = module_type
+        self.properties = []
+
+    def AddString(self, name, value):
+        '''Add a string property.
+
+        Args:
+            name: string
+            value: string
+        '''
+        self.properties.append((name, value, None, True))
+
+    def AddList(self, name, values, style=COMPACT, required=False):
+        '''Add a list property.
+
+        Args:
+            name: string
+            values: iterable of string, copied in iteration order
+            style: string, COMPACT or EXPANDED
+            required: bool, whether to write the property even when empty
+        '''
+        self.properties.append((name, list(values), style, required))
+
+    def Get(self, name, default=None):
+        '''Get the value of a property.
+
+        Args:
+            name: string
+            default: value returned when the module has no such property
+
+        Returns:
+            string or list of string
+        '''
+        for property_name, value, _, _ in self.properties:
+            if property_name == name:
+                return value
+        return default
+
+    def Write(self, f):
+        '''Write the module in blueprint syntax, followed by an empty line.
+
+        Args:
+            f: file object
+        '''
+        write = f.write
+        write('%s {\n' % self.module_type)
+        for name, value, style, required in self.properties:
+            if style is None:
+                write('    %s: "%s",\n' % (name, value))
+            elif not value and not required:
+                continue
+            elif style == COMPACT and len(value) == 1:
+                write('    %s: ["%s"],\n' % (name, value[0]))
+            else:
+                write('    %s: [\n' % name)
+                for i in value:
+                    write('        "%s",\n' % i)
+                write('    ],\n')
+        write('}\n\n')
+
+
+def WriteModules(output_path, modules):
+    '''Append modules to a blueprint file, sorted by name.
+
+    Args:
+        output_path: string
+        modules: dict of string (module name) to Module
+    '''
+    with open(output_path, 'a', WRITE_BUFFER_SIZE) as f:
+        for name in sorted(modules):
+            modules[name].Write(f)
+
+
+def _Tokenize(text):
+    '''Split blueprint text into tokens, skipping comments.
+
+    Args:
+        text: string
+
+    Yields:
+        (token, line) tuples, where token is a string literal with its
+        quotes, a punctuation character or an identifier and line is the
+        1-based line number the token starts on
+
+    Raises:
+        ValueError: on a character no token starts with
+    '''
+    pos = 0
+    line = 1
+    while True:
+        m = WHITESPACE.match(text, pos)
+        line += text.count('\n', pos, m.end())
+        pos = m.end()
+        if pos == len(text):
+            return
+        m = TOKEN.match(text, pos)
+        if m is None:
+            raise ValueError('line %d: unexpected %r' % (line, text[pos]))
+        if m.lastindex is not None:
+            yield m.group(m.lastindex), line
+        pos = m.end()
+
+
+def ParseModules(text):
+    '''Parse blueprint text as written by WriteModules.
+
+    Only the subset of the blueprint syntax used by the generator is
+    supported: modules whose properties are strings or lists of strings.
+    List styles are recovered from the layout, so that writing the modules
+    again gives the same text.
+
+    Args:
+        text: string, content of a blueprint file
+
+    Returns:
+        list of Module, in file order
+
+    Raises:
+        ValueError: if the text is not in the supported syntax
+    '''
+    tokens = list(_Tokenize(text))
+    modules = []
+    pos = [0]
+
+    def Next(expected=None):
+        if pos[0] >= len(tokens):
+            raise ValueError('unexpected end of file')
+        token, line = tokens[pos[0]]
+        pos[0] += 1
+        if expected is not None and token != expected:
+            raise ValueError('line %d: expected %r, got %r' % (
+                line, expected, token))
+        return token, line
+
+    def Unquote(token, line):
+        if not token.startswith('"'):
+            raise ValueError('line %d: expected a string, got %r' % (
+                line, token))
+        return token[1:-1]
+
+    while pos[0] < len(tokens):
+        module_type, _ = Next()
+        module = Module(module_type)
+        Next('{')
+        while True:
+            name, _ = Next()
+            if name == '}':
+                break
+            Next(':')
+            token, line = Next()
+            if token == '[':
+                values = []
+                lines = [line]
+                while True:
+                    token, line = Next()
+                    if token == ']':
+                        lines.append(line)
+                        break
+                    values.append(Unquote(token, line))
+                    lines.append(line)
+                    token, line = Next()
+                    if token == ']':
+                        lines.append(line)
+                        break
+                    if token != ',':
+                        raise ValueError('line %d: expected \',\' or \']\', '
+                                         'got %r' % (line, token))
+                # A single value on the property line is the compact style,
+                # which is also how longer lists are written.
+                if len(values) == 1 and lines[0] != lines[1]:
+                    style = EXPANDED
+                else:
+                    style = COMPACT
+                module.AddList(name, values, style, required=not values)
+            else:
+                module.AddString(name, Unquote(token, line))
+            Next(',')
+        modules.append(module)
+    return modules
+
+
+def ReadModules(input_path):
+    '''Read the modules of a blueprint file.
+
+    Args:
+        input_path: string
+
+    Returns:
+        (header, modules) tuple, where header is the text before the first
+        module, e.g. the license, and modules is a list of Module
+
+    Raises:
+        ValueError: if the file is not in the syntax of ParseModules
+    '''
+    with open(input_path) as f:
+        text = f.read()
+    m = re.compile(r'^[A-Za-z_]', re.M).search(text)
+    start = m.start() if m else len(text)
+    return text[:start], ParseModules(text[start:])
@@ -0,0 +1,314 @@
+#
+# Copyright 2016 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# State kept between runs of android_build_generator so that only the parts
+# of the dry-run dumps and the modules that changed are processed again.
+
+import cPickle
+import hashlib
+import json
+import os
+
+import build_rules
+import make_parser
+
+# Bump when the format of the saved state or of the parsed rules changes.
+STATE_VERSION = 3
+
+
+def Fingerprint(*parts):
+    '''Get a hex digest of JSON serializable values.
+
+    Args:
+        parts: values to fingerprint
+    '''
+    return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+
+class IncrementalState(object):
+    '''Fingerprints of the dump sections and modules of a generator run.
+
+    Sections of the dry-run dumps (see make_parser.SplitSections) whose
+    content is unchanged since the previous run are not parsed again; their
+    rules are taken from the state. Modules whose inputs are unchanged reuse
+    the module generated in the previous run.
+
+    Attributes:
+        ltp_root: string, LTP root directory the state was generated for
+        sections_parsed: int, number of sections parsed in this run
+        sections_reused: int, number of sections taken from the state
+        modules_generated: int, number of modules generated in this run
+        modules_reused: int, number of modules taken from the state
+        _old_sections: dict of string (parser class name) to dict of string
+            (section fingerprint) to list of rules in build_rules.RuleToJson
+            form, from the previous run
+        _old_modules: dict of string (module name) to (fingerprint, module),
+            from the previous run, where module is a blueprint.Module or a
+            list of makefile lines
+        _sections: same as _old_sections, for this run
+        _modules: same as _old_modules, for this run
+    '''
+
+    def __init__(self, ltp_root, sections=None, modules=None):
+        self.ltp_root = ltp_root
+        self.sections_parsed = 0
+        self.sections_reused = 0
+        self.modules_generated = 0
+        self.modules_reused = 0
+        self._old_sections = sections or {}
+        self._old_modules = modules or {}
+        self._sections = {}
+        self._modules = {}
+
+    @classmethod
+    def Load(cls, path, ltp_root):
+        '''Load the state saved by a previous run.
+
+        A missing or unreadable state, or one generated for another LTP root,
+        gives an empty state.
+
+        Args:
+            path: string, path of the state file
+            ltp_root: string, LTP root directory
+
+        Returns:
+            IncrementalState
+        '''
+        try:
+            with open(path, 'rb') as f:
+                data = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return cls(ltp_root)
+
+        if (data.get('version') != STATE_VERSION or
+                data.get('ltp_root') != ltp_root):
+            return cls(ltp_root)
+        return cls(ltp_root, data['sections'], data['modules'])
+
+    def Save(self, path):
+        '''Save the state of this run.
+
+        Sections and modules that were not seen in this run are dropped.
+
+        Args:
+            path: string, path of the state file
+        '''
+        data = {
+            'version': STATE_VERSION,
+            'ltp_root': self.ltp_root,
+            'sections': self._sections,
+            'modules': self._modules,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            cPickle.dump(data, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+    def KeepSections(self, parser):
+        '''Keep the sections of the previous run for a parser.
+
+        Used when a dump is not parsed at all in this run, so that its
+        sections are still available to the next run.
+
+        Args:
+            parser: make_parser.MakeParser or
+                make_install_parser.MakeInstallParser
+        '''
+        kind = type(parser).__name__
+        self._sections[kind] = self._old_sections.get(kind, {})
+
+    def IterRules(self, parser, input_path, jobs=1):
+        '''Parse a dry-run dump, reusing the rules of unchanged sections.
+
+        Args:
+            parser: make_parser.MakeParser or
+                make_install_parser.MakeInstallParser
+            input_path: string, path to the dry-run dump
+            jobs: int, number of processes to parse changed sections with
+
+        Yields:
+            rules in the order they appear in the dump
+        '''
+        kind = type(parser).__name__
+        old_sections = self._old_sections.get(kind, {})
+        new_sections = self._sections.setdefault(kind, {})
+        keys = []
+        changed = []
+        for directory, lines in make_parser.SplitSections(input_path):
+            key = Fingerprint(directory, lines)
+            keys.append(key)
+            if key in new_sections:
+                continue
+            data = old_sections.get(key)
+            if data is not None:
+                self.sections_reused += 1
+                new_sections[key] = data
+            else:
+                changed.append((key, directory, lines))
+                # Mark as seen so that duplicate sections are parsed once.
+                new_sections[key] = None
+
+        sections = [(directory, lines) for _, directory, lines in changed]
+        parsed = make_parser.ParseSections(parser, sections, jobs)
+        for (key, _, _), rules in zip(changed, parsed):
+            self.sections_parsed += 1
+            new_sections[key] = [build_rules.RuleToJson(i) for i in rules]
+
+        for key in keys:
+            for data in new_sections[key]:
+                yield build_rules.RuleFromJson(data)
+
+    def LookupModule(self, name, inputs):
+        '''Get the module generated in the previous run.
+
+        Args:
+            name: string, module name
+            inputs: JSON serializable value, everything the module is
+                generated from
+
+        Returns:
+            the module stored by StoreModule, or None if the module has to
+            be generated
+        '''
+        fingerprint = Fingerprint(inputs)
+        old = self._old_modules.get(name)
+        if old is None or old[0] != fingerprint:
+            return None
+        self.modules_reused += 1
+        self._modules[name] = old
+        return old[1]
+
+    def StoreModule(self, name, inputs, module):
+        '''Record the module generated in this run.
+
+        Args:
+            name: string, module name
+            inputs: JSON serializable value, as passed to LookupModule
+            module: picklable generated module
+        '''
+        self.modules_generated += 1
+        self._modules[name] = (Fingerprint(inputs), module)
+
+    def Summary(self):
+        '''Get a one line summary of the work saved.'''
+        return ('Incremental: reused %d of %d dump sections and %d of %d '
+                'modules' % (self.sections_reused,
+                             self.sections_reused + self.sections_parsed,
+                             self.modules_reused,
+                             self.modules_reused + self.modules_generated))
+
+
+class ParseCache(object):
+    '''Rules parsed from dry-run dumps, keyed by the content of the dump.
+
+    Each entry is a pickled list of rules stored in cache_dir under a hash of
+    the dump content, the parser and the LTP root, so a dump that has not
+    changed since a previous run is not parsed again.
+
+    Attributes:
+        cache_dir: string, directory holding the cache entries
+        ltp_root: string, LTP root directory
+        hits: int, number of dumps loaded from the cache
+        misses: int, number of dumps that had to be parsed
+    '''
+
+    # Number of most recently used entries kept in cache_dir.
+    MAX_ENTRIES = 8
+
+    def __init__(self, cache_dir, ltp_root):
+        self.cache_dir = cache_dir
+        self.ltp_root = ltp_root
+        self.hits = 0
+        self.misses = 0
+
+    def Key(self, parser, input_path):
+        '''Get the cache key of a dump.
+
+        Args:
+            parser: make_parser.MakeParser or
+                make_install_parser.MakeInstallParser
+            input_path: string, path to the dry-run dump
+
+        Returns:
+            string, hex digest
+        '''
+        digest = hashlib.sha1()
+        digest.update('%d\0%s\0%s\0' % (STATE_VERSION, type(parser).__name__,
+                                         self.ltp_root))
+        with open(input_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _Path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def Load(self, key):
+        '''Load the rules of a dump.
+
+        Args:
+            key: string, as returned by Key
+
+        Returns:
+            list of rules, or None if the dump is not in the cache
+        '''
+        path = self._Path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Mark the entry as recently used.
+        os.utime(path, None)
+        return [build_rules.RuleFromJson(i) for i in data]
+
+    def Store(self, key, rules):
+        '''Store the rules of a dump and drop the least recently used entries.
+
+        Args:
+            key: string, as returned by Key
+            rules: list of rules, in the order they appear in the dump
+        '''
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = self._Path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            cPickle.dump([build_rules.RuleToJson(i) for i in rules], f,
+                         cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+        entries = [os.path.join(self.cache_dir, i)
+                   for i in os.listdir(self.cache_dir)
+                   if i.endswith('.pickle')]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for i in entries[self.MAX_ENTRIES:]:
+            os.remove(i)
+
+    def Invalidate(self):
+        '''Remove all cache entries.'''
+        if not os.path.isdir(self.cache_dir):
+            return
+        for i in os.listdir(self.cache_dir):
+            if i.endswith('.pickle'):
+                os.remove(os.path.join(self.cache_dir, i))
+
+    def Summary(self):
+        '''Get a one line summary of the cache use.'''
+        return 'Parse cache: %d of %d dumps loaded from %s' % (
+            self.hits, self.hits + self.misses, self.cache_dir)
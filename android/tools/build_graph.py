@@ -0,0 +1,242 @@
+#
+# Copyright 2016 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Dependency graph of the targets found in the output of make --dry-run:
+# objects -> sources, libraries -> objects and executables -> objects and
+# libraries. Sources, flags and disabled state are resolved for every target
+# in a single pass over the graph in topological order.
+
+import os
+
+OBJECT = 'object'
+LIBRARY = 'library'
+EXECUTABLE = 'executable'
+
+
+class TargetNode(object):
+    '''A target in the dependency graph.
+
+    Attributes:
+        target: string, target path relative to LTP root
+        kind: string, one of OBJECT, LIBRARY or EXECUTABLE
+        rule: build_rules.CcRule or build_rules.ArRule the target is built by
+        deps: list of (kind, target) keys of the targets this one depends on
+        sources: list or set of string, .c files needed to build the target
+        cflags: list or set of string, flags needed to build the target
+        includes: list or set of string, include directories needed to build
+            the target
+        libraries: list of string, libraries linked by an executable
+        disabled: string, reason the target can't be built, or None
+    '''
+    __slots__ = ('target', 'kind', 'rule', 'deps', 'sources', 'cflags',
+                 'includes', 'libraries', 'disabled')
+
+    def __init__(self, target, kind, rule, deps):
+        self.target = target
+        self.kind = kind
+        self.rule = rule
+        self.deps = deps
+        self.sources = None
+        self.cflags = None
+        self.includes = None
+        self.libraries = []
+        self.disabled = None
+
+
+class DependencyGraph(object):
+    '''Dependency graph of the targets of a build_rules.RuleSet.
+
+    Attributes:
+        _nodes: dict of (kind, target) to TargetNode
+        _order: list of (kind, target), keys of _nodes in the order of the
+            rule set: objects, libraries, executables built from .c files,
+            then executables linked from .o files
+        _library_name: function converting an ar target to a library name
+    '''
+
+    def __init__(self, rule_set, library_name):
+        '''Build the graph.
+
+        Args:
+            rule_set: build_rules.RuleSet
+            library_name: function converting an ar target to the library
+                name used with -l
+        '''
+        self._library_name = library_name
+        self._nodes = {}
+        self._order = []
+
+        libraries = {}
+        for target, rule in rule_set.cc_compile.iteritems():
+            self._AddNode(target, OBJECT, rule, [])
+        for target, rule in rule_set.ar.iteritems():
+            self._AddNode(target, LIBRARY, rule,
+                          [(OBJECT, i) for i in rule.sources])
+            libraries.setdefault(library_name(target), []).append(target)
+        for cc_rules in (rule_set.cc_compilelink, rule_set.cc_link):
+            for target, rule in cc_rules.iteritems():
+                deps = [(OBJECT, i) for i in rule.sources if i.endswith('.o')]
+                for lib in rule.libraries:
+                    deps.extend((LIBRARY, i) for i in libraries.get(lib, []))
+                self._AddNode(target, EXECUTABLE, rule, deps)
+
+    def _AddNode(self, target, kind, rule, deps):
+        key = (kind, target)
+        if key not in self._nodes:
+            self._order.append(key)
+        self._nodes[key] = TargetNode(target, kind, rule, deps)
+
+    def Nodes(self, kind):
+        '''Get the nodes of a kind, in the order of the rule set.
+
+        Executables built from .c files come before executables linked from
+        .o files.
+
+        Args:
+            kind: string, one of OBJECT, LIBRARY or EXECUTABLE
+        '''
+        return [self._nodes[key] for key in self._order if key[0] == kind]
+
+    def TopologicalOrder(self):
+        '''Get the nodes so that every node comes after its dependencies.
+
+        Dependencies without a node in the graph are skipped.
+
+        Raises:
+            ValueError: if the graph has a cycle
+        '''
+        result = []
+        state = {}
+        for root in self._order:
+            if root in state:
+                continue
+            stack = [(root, iter(self._nodes[root].deps))]
+            state[root] = 'visiting'
+            while stack:
+                key, deps = stack[-1]
+                for dep in deps:
+                    if dep not in self._nodes:
+                        continue
+                    if state.get(dep) == 'visiting':
+                        raise ValueError('dependency cycle through %s' %
+                                         dep[1])
+                    if dep not in state:
+                        state[dep] = 'visiting'
+                        stack.append((dep, iter(self._nodes[dep].deps)))
+                        break
+                else:
+                    stack.pop()
+                    state[key] = 'done'
+                    result.append(self._nodes[key])
+        return result
+
+    def Resolve(self, disabled_tests, disabled_libs, disabled_cflags):
+        '''Resolve sources, flags and disabled state of every target.
+
+        Sources, flags and include directories of libraries and of
+        executables linked from .o files are the superset of those of their
+        objects. A target is disabled if it is in disabled_tests (executables
+        only, by basename), links a disabled library, uses a disabled cflag,
+        or depends on a disabled or missing target.
+
+        Args:
+            disabled_tests: set of string, disabled test names
+            disabled_libs: set of string, disabled library names
+            disabled_cflags: set of string, disabled cflags
+        '''
+        for node in self.TopologicalOrder():
+            rule = node.rule
+            if node.kind == OBJECT:
+                node.sources = rule.sources
+                node.cflags = rule.flags
+                node.includes = rule.includes
+            elif node.kind == LIBRARY:
+                self._Aggregate(node, rule.sources)
+                node.sources = sorted(node.sources)
+                node.cflags = sorted(node.cflags)
+                node.includes = sorted(node.includes)
+                if self._library_name(node.target) in disabled_libs:
+                    node.disabled = 'disabled library'
+            elif rule.kind == 'link':
+                # Android.mk requires a consistent set of flags across a
+                # given target. Thankfully using the superset of all flags in
+                # the target works fine with LTP tests.
+                self._Aggregate(node, rule.sources)
+                node.libraries = rule.libraries
+            else:
+                node.sources = []
+                for i in rule.sources:
+                    # some targets may have a mix of .c and .o files in srcs
+                    # find the .c files to build those .o from their objects
+                    if not i.endswith('.o'):
+                        node.sources.append(i)
+                    elif (OBJECT, i) in self._nodes:
+                        node.sources.extend(self._nodes[(OBJECT, i)].sources)
+                node.cflags = rule.flags
+                node.includes = rule.includes
+                node.libraries = rule.libraries
+
+            if node.disabled:
+                continue
+            if (node.kind == EXECUTABLE and
+                    os.path.basename(node.target) in disabled_tests):
+                node.disabled = 'disabled test'
+                continue
+            libs = sorted(set(node.libraries).intersection(disabled_libs))
+            if libs:
+                node.disabled = 'requires disabled library %s' % libs[0]
+                continue
+            cflags = sorted(set(node.cflags).intersection(disabled_cflags))
+            if cflags:
+                node.disabled = 'requires disabled cflag %s' % cflags[0]
+                continue
+            for dep in node.deps:
+                dep_node = self._nodes.get(dep)
+                if dep_node is None:
+                    node.disabled = 'no rule to build %s' % dep[1]
+                    break
+                if dep_node.disabled:
+                    node.disabled = 'depends on %s (%s)' % (
+                        os.path.basename(dep[1]), dep_node.disabled)
+                    break
+
+    def _Aggregate(self, node, objects):
+        '''Accumulate sources, flags and includes of objects into node.'''
+        node.sources = set()
+        node.cflags = set()
+        node.includes = set()
+        for obj in objects:
+            obj_node = self._nodes.get((OBJECT, obj))
+            if obj_node is None:
+                continue
+            for i in obj_node.sources:
+                node.sources.add(i)
+            for i in obj_node.cflags:
+                node.cflags.add(i)
+            for i in obj_node.includes:
+                node.includes.add(i)
+
+    def Fallout(self):
+        '''Get the executables disabled because of disabled libs or cflags.
+
+        Executables listed in disabled_tests are not included.
+
+        Returns:
+            list of (target, reason) tuples sorted by target
+        '''
+        return sorted((node.target, node.disabled)
+                      for node in self.Nodes(EXECUTABLE)
+                      if node.disabled and node.disabled != 'disabled test')
@@ -0,0 +1,181 @@
+#
+# Copyright 2016 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Per-phase timings of the Android build generation, see the --profile
+# option of android_build_generator.
+
+import contextlib
+import json
+import os
+import resource
+import time
+
+
+def PeakRssKb():
+    '''Get the peak resident set size of this process and its children.
+
+    Returns:
+        (self, children) tuple of int, in kilobytes
+    '''
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def CpuSeconds():
+    '''Get the CPU time used by this process and its children so far.'''
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+def CountLines(input_path):
+    '''Count the lines of a file.'''
+    with open(input_path, 'rb') as f:
+        return sum(chunk.count(b'\n')
+                   for chunk in iter(lambda: f.read(1 << 20), b''))
+
+
+def ParserCounters(parser):
+    '''Get the counters of a dry-run dump parser worth profiling.
+
+    Args:
+        parser: make_parser.MakeParser or
+            make_install_parser.MakeInstallParser
+
+    Returns:
+        dict of string to int
+    '''
+    counters = {}
+    for name in ('path_cache_hits', 'path_cache_misses', 'stats_avoided',
+                 'index_calls'):
+        if hasattr(parser, name):
+            counters[name] = getattr(parser, name)
+    return counters
+
+
+class Profiler(object):
+    '''Records wall time, CPU time, memory and counters per phase.
+
+    The peak RSS of a process only grows, so the memory of a phase is how
+    much it raised the peak RSS of the process and of its children:
+    rss_increase_kb and children_rss_increase_kb. rss_high_water_kb and
+    children_rss_high_water_kb are the peaks at the end of the phase,
+    cumulative over all phases so far.
+
+    Attributes:
+        phases: list of dict, one per phase in the order they ended
+    '''
+
+    def __init__(self):
+        self.phases = []
+
+    @contextlib.contextmanager
+    def Phase(self, name):
+        '''Time a phase.
+
+        Usage:
+            with profiler.Phase('parse') as counters:
+                counters['lines'] = ...
+
+        Args:
+            name: string, name of the phase
+
+        Yields:
+            dict, counters of the phase to fill in, e.g. lines or rules
+        '''
+        counters = {}
+        start_rss = PeakRssKb()
+        start_wall = time.time()
+        start_cpu = CpuSeconds()
+        try:
+            yield counters
+        finally:
+            self.AddPhase(name, time.time() - start_wall,
+                          CpuSeconds() - start_cpu, start_rss, **counters)
+
+    def AddPhase(self, name, wall_seconds, cpu_seconds=None, start_rss=None,
+                 **counters):
+        '''Record a phase timed elsewhere.
+
+        Args:
+            name: string, name of the phase
+            wall_seconds: float
+            cpu_seconds: float, or None if unknown
+            start_rss: PeakRssKb() at the start of the phase, or None if the
+                phase didn't run in this process or its children
+            counters: additional values to record for the phase
+        '''
+        rss, children_rss = PeakRssKb()
+        phase = {
+            'name': name,
+            'wall_seconds': round(wall_seconds, 6),
+            'cpu_seconds': (None if cpu_seconds is None else
+                            round(cpu_seconds, 6)),
+            'rss_increase_kb': (None if start_rss is None else
+                                rss - start_rss[0]),
+            'children_rss_increase_kb': (None if start_rss is None else
+                                         children_rss - start_rss[1]),
+            'rss_high_water_kb': rss,
+            'children_rss_high_water_kb': children_rss,
+        }
+        phase.update(counters)
+        self.phases.append(phase)
+
+    def Report(self):
+        '''Get the report of all phases.
+
+        Returns:
+            dict with the phases and their totals
+        '''
+        rss, children_rss = PeakRssKb()
+        return {
+            'phases': self.phases,
+            'total': {
+                'wall_seconds': round(sum(i['wall_seconds']
+                                          for i in self.phases), 6),
+                'cpu_seconds': round(sum(i['cpu_seconds'] or 0
+                                         for i in self.phases), 6),
+                'rss_high_water_kb': rss,
+                'children_rss_high_water_kb': children_rss,
+            },
+        }
+
+    def Write(self, output_path):
+        '''Write the report as JSON.
+
+        Args:
+            output_path: string
+        '''
+        with open(output_path, 'w') as f:
+            json.dump(self.Report(), f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    def Summary(self):
+        '''Get a human readable table of the phases.
+
+        The rss column is how much a phase raised the peak RSS of the
+        process, the high water column the cumulative peak RSS at its end.
+        '''
+        lines = ['%-20s %10s %10s %14s %16s' % (
+            'phase', 'wall (s)', 'cpu (s)', '+rss (KB)', 'high water (KB)')]
+        for phase in self.phases:
+            cpu = phase['cpu_seconds']
+            increase = phase['rss_increase_kb']
+            lines.append('%-20s %10.3f %10s %14s %16d' % (
+                phase['name'], phase['wall_seconds'],
+                '-' if cpu is None else '%.3f' % cpu,
+                '-' if increase is None else increase,
+                phase['rss_high_water_kb']))
+        return '\n'.join(lines)
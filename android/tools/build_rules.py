@@ -0,0 +1,203 @@
+#
+# Copyright 2016 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Typed records for the rules found in the output of make --dry-run and
+# make install --dry-run, passed from make_parser and make_install_parser to
+# android_build_generator.
+
+
+def UniqueKeepOrder(sequence):
+    '''Get a copy of list where items are unique and order is preserved.
+
+    Args:
+      sequence: a sequence, can be a list, tuple, or other iterable
+
+    Returns:
+        a list where items copied from input sequence are unique
+        and order is preserved.
+    '''
+    seen = set()
+    return [x for x in sequence if not (x in seen or seen.add(x))]
+
+
+class CcRule(object):
+    '''A gcc command found in the output of make --dry-run.
+
+    Attributes:
+        target: string, target path relative to LTP root
+        kind: string, one of 'compile', 'link' or 'compilelink'
+        sources: list of string, .c or .o files relative to LTP root
+        flags: list of string, -D and -Wno flags passed to gcc
+        includes: list of string, -I paths relative to LTP root
+        libraries: list of string, -l libraries passed to gcc
+    '''
+    __slots__ = ('target', 'kind', 'sources', 'flags', 'includes',
+                 'libraries')
+
+    def __init__(self, target, kind, sources, flags, includes, libraries):
+        self.target = target
+        self.kind = kind
+        self.sources = sources
+        self.flags = flags
+        self.includes = includes
+        self.libraries = libraries
+
+    def Directives(self):
+        '''Get the rule in the text form of make_parser directives.'''
+        result = ["cc_%s['%s'] = %s" % (self.kind, self.target, self.sources)]
+        if self.kind != 'compile':
+            result.append("cc_libraries['%s'] = %s" %
+                          (self.target, self.libraries))
+        result.append("cc_flags['%s'] = %s" % (self.target, self.flags))
+        result.append("cc_includes['%s'] = %s" % (self.target, self.includes))
+        return result
+
+
+class ArRule(object):
+    '''An ar command found in the output of make --dry-run.
+
+    Attributes:
+        target: string, .a target path relative to LTP root
+        sources: list of string, .o files relative to LTP root
+    '''
+    __slots__ = ('target', 'sources')
+
+    def __init__(self, target, sources):
+        self.target = target
+        self.sources = sources
+
+    def Directives(self):
+        '''Get the rule in the text form of make_parser directives.'''
+        return ["ar['%s'] = %s" % (self.target, self.sources)]
+
+
+class InstallRule(object):
+    '''An install command found in the output of make install --dry-run.
+
+    Attributes:
+        target: string, install path relative to the LTP install root
+        source: string, prebuilt source file relative to LTP root
+    '''
+    __slots__ = ('target', 'source')
+
+    def __init__(self, target, source):
+        self.target = target
+        self.source = source
+
+    def Directives(self):
+        '''Get the rule in the text form of make_install_parser directives.'''
+        return ["install['%s'] = ['%s']" % (self.target, self.source)]
+
+
+class RuleSet(object):
+    '''Parsed rules keyed by target.
+
+    A rule added for a target replaces any earlier rule of the same kind for
+    that target. Lists in added rules are deduplicated, keeping their order.
+
+    Attributes:
+        ar: dict of string (.a target) to ArRule
+        cc_compile: dict of string (.o target) to CcRule
+        cc_link: dict of string (executable target) to CcRule linking .o files
+        cc_compilelink: dict of string (executable target) to CcRule
+            building .c files
+        install: dict of string (install target) to InstallRule
+    '''
+    __slots__ = ('ar', 'cc_compile', 'cc_link', 'cc_compilelink', 'install')
+
+    def __init__(self):
+        self.ar = {}
+        self.cc_compile = {}
+        self.cc_link = {}
+        self.cc_compilelink = {}
+        self.install = {}
+
+    def Add(self, rule):
+        '''Add a rule.
+
+        Args:
+            rule: ArRule, CcRule or InstallRule
+        '''
+        if isinstance(rule, CcRule):
+            rule.sources = UniqueKeepOrder(rule.sources)
+            rule.flags = UniqueKeepOrder(rule.flags)
+            rule.includes = UniqueKeepOrder(rule.includes)
+            rule.libraries = UniqueKeepOrder(rule.libraries)
+            getattr(self, 'cc_' + rule.kind)[rule.target] = rule
+        elif isinstance(rule, ArRule):
+            rule.sources = UniqueKeepOrder(rule.sources)
+            self.ar[rule.target] = rule
+        else:
+            self.install[rule.target] = rule
+
+    def Extend(self, rules):
+        '''Add rules in order.
+
+        Args:
+            rules: iterable of ArRule, CcRule or InstallRule
+        '''
+        for rule in rules:
+            self.Add(rule)
+
+    def Rules(self):
+        '''Get all rules, grouped by kind.'''
+        for kind in self.__slots__:
+            for rule in getattr(self, kind).itervalues():
+                yield rule
+
+    def Directives(self):
+        '''Get the rules in the text form of parser directives.
+
+        Only meant for debugging, see the --dump_rules option of
+        android_build_generator.
+        '''
+        result = []
+        for rule in self.Rules():
+            result.extend(rule.Directives())
+        return result
+
+
+def RuleToJson(rule):
+    '''Convert a rule to a JSON serializable list.
+
+    Args:
+        rule: ArRule, CcRule or InstallRule
+
+    Returns:
+        list, a copy of the rule that RuleFromJson converts back
+    '''
+    if isinstance(rule, CcRule):
+        return ['cc', rule.target, rule.kind, list(rule.sources),
+                list(rule.flags), list(rule.includes), list(rule.libraries)]
+    if isinstance(rule, ArRule):
+        return ['ar', rule.target, list(rule.sources)]
+    return ['install', rule.target, rule.source]
+
+
+def RuleFromJson(data):
+    '''Convert a list produced by RuleToJson back to a rule.
+
+    Args:
+        data: list
+
+    Returns:
+        ArRule, CcRule or InstallRule
+    '''
+    if data[0] == 'cc':
+        return CcRule(*data[1:])
+    if data[0] == 'ar':
+        return ArRule(*data[1:])
+    return InstallRule(*data[1:])
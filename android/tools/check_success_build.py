@@ -17,7 +17,227 @@
 
 import os
 import argparse
+import json
 import math
+import sqlite3
+import stat
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+import blueprint
+
+# Start of the packages in ltp_package_list.mk, see
+# android_build_generator.WritePackageList.
+PACKAGE_LIST_START = 'ltp_packages := \\\n  '
+
+
+class OutputFiles(object):
+    """Index of the files in a build output directory
+
+    The whole directory is listed once, so that checking a module does not
+    need a file system call. Without the index, every check is an
+    os.path.isfile call.
+
+    Attribute:
+       fs_calls: int, number of file system calls made so far
+       _root: string, output directory, ending with a slash
+       _use_index: bool, whether to list the directory once
+       _jobs: int, number of threads listing the top level directories
+       _files: set of string, file paths relative to _root, or None until
+               the directory is listed
+    """
+
+    def __init__(self, root, use_index=True, jobs=1):
+        self.fs_calls = 0
+        self._root = root
+        self._use_index = use_index
+        self._jobs = jobs
+        self._files = None
+
+    def _ListDirectory(self, directory):
+        """List a directory without descending into it
+
+        Uses scandir when available, which tells files from directories
+        without a stat call per entry.
+
+        Args:
+           directory: string, directory relative to _root, empty for _root
+
+        Returns:
+           (files, subdirs, calls) tuple: lists of paths relative to _root
+           and number of file system calls made
+        """
+        path = os.path.join(self._root, directory)
+        calls = 1
+        if scandir is not None:
+            entries = [(entry.name, entry.is_dir()) for entry in scandir(path)]
+        else:
+            entries = []
+            for name in os.listdir(path):
+                calls += 1
+                entries.append((name, os.path.isdir(os.path.join(path, name))))
+        files = []
+        subdirs = []
+        for name, is_dir in entries:
+            (subdirs if is_dir else files).append(os.path.join(directory, name))
+        return files, subdirs, calls
+
+    def _ListTree(self, top):
+        """List the files under a directory
+
+        Args:
+           top: string, directory relative to _root
+
+        Returns:
+           (files, calls) tuple: list of file paths relative to _root and
+           number of file system calls made
+        """
+        result = []
+        calls = 0
+        stack = [top]
+        while stack:
+            files, subdirs, directory_calls = self._ListDirectory(stack.pop())
+            result.extend(files)
+            stack.extend(subdirs)
+            calls += directory_calls
+        return result, calls
+
+    def Build(self):
+        """List the output directory
+
+        Top level directories are listed in parallel when jobs > 1, which
+        helps on network file systems.
+        """
+        self._files = set()
+        self.fs_calls += 1
+        if not os.path.isdir(self._root):
+            return
+        files, subdirs, calls = self._ListDirectory("")
+        self._files.update(files)
+        self.fs_calls += calls
+        if self._jobs > 1:
+            pool = ThreadPool(self._jobs)
+            try:
+                results = pool.map(self._ListTree, subdirs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self._ListTree(i) for i in subdirs]
+        for files, calls in results:
+            self._files.update(files)
+            self.fs_calls += calls
+
+    def Files(self):
+        """Get the files of the output directory
+
+        Returns:
+           set of string, file paths relative to the output directory
+        """
+        if self._files is None:
+            self.Build()
+        return self._files
+
+    def Stat(self, relative_path):
+        """Get the modification time and size of a file
+
+        With the index, files missing from the index are not stat'ed.
+
+        Args:
+           relative_path: string, path relative to the output directory
+
+        Returns:
+           (mtime, size) tuple, or None if the file does not exist
+        """
+        if self._use_index and relative_path not in self.Files():
+            return None
+        self.fs_calls += 1
+        try:
+            st = os.stat(self._root + relative_path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return st.st_mtime, st.st_size
+
+    def Contains(self, relative_path):
+        """Check whether a file exists in the output directory
+
+        Args:
+           relative_path: string, path relative to the output directory
+
+        Returns:
+           True if the file exists
+        """
+        if not self._use_index:
+            self.fs_calls += 1
+            return os.path.isfile(self._root + relative_path)
+        return relative_path in self.Files()
+
+
+class StatusDatabase(object):
+    """Build status of the modules found by previous checks
+
+    Statuses are stored per target product in a SQLite database, with the
+    modification time and size of the artifact of each module, so that a
+    check can tell which modules broke or got fixed since the previous one
+    and skip checks whose artifact did not change.
+
+    A status is a (type, artifact, mtime, size, reason) tuple: module type,
+    artifact path relative to its output directory or None, modification
+    time and size of the artifact or None, and reason of the failure or
+    None if the module was built.
+
+    Attribute:
+       _connection: sqlite3.Connection
+    """
+    _connection = None
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS module_status ("
+            "product TEXT NOT NULL, name TEXT NOT NULL, type TEXT, "
+            "artifact TEXT, mtime REAL, size INTEGER, reason TEXT, "
+            "PRIMARY KEY (product, name))")
+
+    def Load(self, product):
+        """Get the statuses of the previous check of a product
+
+        Args:
+           product: string, target product name
+
+        Returns:
+           dict of string (module name) to status tuple
+        """
+        rows = self._connection.execute(
+            "SELECT name, type, artifact, mtime, size, reason "
+            "FROM module_status WHERE product = ?", (product,))
+        return dict((row[0], tuple(row[1:])) for row in rows)
+
+    def Save(self, product, statuses):
+        """Replace the statuses of a product
+
+        Args:
+           product: string, target product name
+           statuses: dict of string (module name) to status tuple
+        """
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM module_status WHERE product = ?", (product,))
+            self._connection.executemany(
+                "INSERT INTO module_status VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((product, name) + tuple(status)
+                 for name, status in statuses.iteritems()))
+
+    def Close(self):
+        """Close the database"""
+        self._connection.close()
 
 
 class Module(object):
@@ -29,15 +249,19 @@ class Module(object):
        _type: string, type of module
        _path: string, path of module
        _output_dir: string, output directory of module
+       _output_files: OutputFiles, files of the output directory
     """
     _lines = None
     _header = None
     _type = None
     _path = None
     _output_dir = None
+    _output_files = None
 
-    def __init__(self, output_dir):
+    def __init__(self, output_dir, output_files=None):
         self._output_dir = output_dir
+        self._output_files = output_files or OutputFiles(output_dir,
+                                                         use_index=False)
 
     def parse(self, module_text):
         """parse a module text
@@ -62,6 +286,23 @@ class Module(object):
         self._path = self._header[1]
         return self
 
+    def GetName(self):
+        """Get the module path, which names it"""
+        return self._path
+
+    def GetType(self):
+        """Get the module type, e.g. module_testname"""
+        return self._type
+
+    def GetArtifact(self):
+        """Get the path of the module output relative to the output
+           directory, or None for libraries
+        """
+        return {"module_testname": "testcases/bin/" + \
+                                   os.path.basename(self._path),
+                "module_prebuilt": self._path,
+                }.get(self._type)
+
     def IsBuildSuccess(self, counts):
         """Check whether a given module specified in Android.mk file
            is succesfully built
@@ -95,9 +336,7 @@ class Module(object):
                True if success
         """
 
-        return os.path.isfile(self._output_dir + \
-                              "testcases/bin/" + \
-                              os.path.basename(self._path))
+        return self._output_files.Contains(self.GetArtifact())
 
     def IsBuildSuccessModuleLibname(self):
         """Check whether a given ltp lib module in Android.mk file
@@ -126,22 +365,39 @@ class Module(object):
            Returns:
                True if success
         """
-        return os.path.isfile(self._output_dir + self._path)
+        return self._output_files.Contains(self.GetArtifact())
 
 
 class LtpModuleChecker(object):
     """LTP module result check class.
     Checks for success build of each module in LTP's Android.mk file
-    and rewrite it with only successfully built modules.
+    and gen.bp, and rewrite gen.bp with only successfully built modules.
     """
+    _android_build_top = ""
     _output_dir = ""
     _file_path_android_ltp_mk = ""
+    _file_path_package_list = ""
     _module_counts = {}
-
-    def __init__(self, android_build_top, ltp_dir, target_product):
+    _output_files = None
+    _target_product = ""
+    _status_db = None
+    _previous_statuses = None
+    _statuses = None
+
+    def __init__(self, android_build_top, ltp_dir, target_product,
+                 use_index=True, jobs=1, status_db=None):
+        self._android_build_top = android_build_top
+        self._target_product = target_product
+        self._module_counts = {}
+        self._status_db = status_db
+        self._previous_statuses = (status_db.Load(target_product)
+                                   if status_db is not None else {})
+        self._statuses = {}
         self._output_dir = android_build_top + '/out/target/product/' + \
                           target_product + '/data/nativetest/ltp/'
         self._file_path_android_ltp_mk = ltp_dir + '/Android.ltp.mk'
+        self._file_path_package_list = ltp_dir + '/ltp_package_list.mk'
+        self._output_files = OutputFiles(self._output_dir, use_index, jobs)
 
     def Read(self, file_path):
         """Read a file and return its entire content
@@ -163,13 +419,22 @@ class LtpModuleChecker(object):
 
     def CheckModules(self):
         """Start the LTP module build result checking and counting."""
-        modules = [Module(self._output_dir).parse(module)
+        start = time.time()
+        modules = [Module(self._output_dir, self._output_files).parse(module)
                    for module in self.LoadModules()]
-        modules_succeed = \
-            [module for module in modules
-             if module is not None and
-             module.IsBuildSuccess(self._module_counts)
-            ]
+        modules_succeed = []
+        for module in modules:
+            if module is None:
+                continue
+            success = module.IsBuildSuccess(self._module_counts)
+            if success:
+                modules_succeed.append(module)
+            artifact = module.GetArtifact()
+            self._statuses[module.GetName()] = (
+                module.GetType(), artifact) + (
+                (self._output_files.Stat(artifact) or (None, None))
+                if success and artifact else (None, None)) + (
+                None if success else "not built",)
 
         print "module type counts:"
         print self._module_counts
@@ -178,8 +443,234 @@ class LtpModuleChecker(object):
               " of " + str(sum([self._module_counts[i]
               for i in self._module_counts])) + \
               " modules were succesfully built."
+        print "Checked in %.3f seconds with %d file system calls." % (
+            time.time() - start, self._output_files.fs_calls)
         print "--Check complete."
 
+    def FindStaticLibrary(self, intermediates_dir, name):
+        """Find the output of a cc_library_static module
+
+           Soong writes the library to a variant directory, e.g.
+           android_arm64_armv8-a_static, of the module intermediates.
+
+           Args:
+               intermediates_dir: string, intermediates directory of the
+                                  blueprint file's directory
+               name: string, module name
+
+           Returns:
+               string, path of the library relative to intermediates_dir,
+               or None if it was not built
+        """
+        library_files = OutputFiles(
+            os.path.join(intermediates_dir, name) + '/')
+        library_files.Build()
+        self._output_files.fs_calls += library_files.fs_calls
+        for i in sorted(library_files.Files()):
+            if os.path.basename(i) == name + '.a':
+                return os.path.join(name, i)
+        return None
+
+    def StatStaticLibrary(self, intermediates_dir, name):
+        """Get the artifact of a cc_library_static module
+
+           The library found by the previous check is reused if it did not
+           change since, which saves listing the module intermediates.
+
+           Args:
+               intermediates_dir: string, intermediates directory of the
+                                  blueprint file's directory
+               name: string, module name
+
+           Returns:
+               (artifact, mtime, size) tuple, all None if not built
+        """
+        library_files = OutputFiles(intermediates_dir + '/',
+                                    use_index=False)
+        previous = self._previous_statuses.get(name)
+        artifact = None
+        if previous is not None and previous[1] is not None:
+            artifact_stat = library_files.Stat(previous[1])
+            if artifact_stat is not None and \
+                    artifact_stat == tuple(previous[2:4]):
+                artifact = previous[1]
+
+        if artifact is None:
+            artifact = self.FindStaticLibrary(intermediates_dir, name)
+            artifact_stat = (library_files.Stat(artifact)
+                             if artifact is not None else None)
+        self._output_files.fs_calls += library_files.fs_calls
+        if artifact_stat is None:
+            return None, None, None
+        return (artifact,) + artifact_stat
+
+    def CheckBlueprintModule(self, module, intermediates_dir, failed):
+        """Check whether a module of gen.bp was succesfully built
+
+           Args:
+               module: blueprint.Module
+               intermediates_dir: string, intermediates directory of the
+                                  blueprint file's directory
+               failed: dict of string (name) to string (reason), failed
+                       modules checked so far
+
+           Returns:
+               None if success, else string, reason of the failure
+        """
+        name = module.Get("name")
+        artifact = None
+        artifact_stat = (None, None)
+        reason = None
+        for lib in module.Get("static_libs", []):
+            if lib in failed:
+                reason = "depends on failed " + lib
+                break
+
+        if reason is not None:
+            pass
+        elif module.module_type in ("cc_test", "sh_test"):
+            if module.module_type == "cc_test":
+                artifact = "testcases/bin/" + module.Get("stem", name)
+            else:
+                sub_dir = module.Get("sub_dir")
+                if sub_dir.startswith("ltp/"):
+                    sub_dir = sub_dir[len("ltp/"):]
+                artifact = os.path.join(sub_dir, module.Get("filename", name))
+            artifact_stat = self._output_files.Stat(artifact)
+            if artifact_stat is None:
+                artifact_stat = (None, None)
+                reason = "not built"
+        elif module.module_type == "cc_library_static":
+            artifact, mtime, size = self.StatStaticLibrary(intermediates_dir,
+                                                           name)
+            artifact_stat = (mtime, size)
+            if artifact is None:
+                reason = "not built"
+        else:
+            print "Checking " + module.module_type + " is not supported, " + \
+                "assuming build success: " + name
+
+        self._statuses[name] = (module.module_type, artifact) + \
+            tuple(artifact_stat) + (reason,)
+        return reason
+
+    def WritePrunedPackageList(self, output_path, failed):
+        """Write ltp_package_list.mk without the failed modules
+
+           Android.mk requires every module of the package list, so it has
+           to be pruned along with gen.bp.
+
+           Args:
+               output_path: string
+               failed: collection of string, names of the failed modules
+        """
+        text = self.Read(self._file_path_package_list)
+        start = text.index(PACKAGE_LIST_START)
+        packages = [i.strip() for i in
+                    text[start + len(PACKAGE_LIST_START):].split(" \\\n")]
+        with open(output_path, "w") as f:
+            f.write(text[:start + len(PACKAGE_LIST_START)])
+            f.write(" \\\n  ".join(i for i in packages
+                                     if i and i not in failed))
+
+    def CheckBlueprint(self, bp_path, pruned_bp_path=None,
+                       failure_list_path=None, pruned_package_list_path=None):
+        """Check the modules of gen.bp and prune the failed ones
+
+           Libraries are checked first, so that modules linking a failed
+           library are pruned along with it.
+
+           Args:
+               bp_path: string, path of gen.bp
+               pruned_bp_path: string, path to write gen.bp with only the
+                               successfully built modules to, or None
+               pruned_package_list_path: string, path to write
+                               ltp_package_list.mk without the failed
+                               modules to, required with pruned_bp_path
+               failure_list_path: string, path to write the failed modules
+                                  to as JSON, or None
+
+           Returns:
+               dict of string (module name) to string (reason), the failed
+               modules
+        """
+        start = time.time()
+        header, modules = blueprint.ReadModules(bp_path)
+        intermediates_dir = os.path.join(
+            self._android_build_top, "out", "soong", ".intermediates",
+            os.path.relpath(os.path.dirname(os.path.abspath(bp_path)),
+                            os.path.abspath(self._android_build_top)))
+
+        counts = {}
+        failed = {}
+        ordered = sorted(modules, key=lambda i:
+                         i.module_type != "cc_library_static")
+        for module in ordered:
+            counts[module.module_type] = counts.get(module.module_type, 0) + 1
+            reason = self.CheckBlueprintModule(module, intermediates_dir,
+                                               failed)
+            if reason is not None:
+                failed[module.Get("name")] = reason
+                print "  Module build failed: %s (%s)" % (module.Get("name"),
+                                                          reason)
+
+        print "blueprint module type counts:"
+        print counts
+        print "%d of %d blueprint modules were succesfully built." % (
+            len(modules) - len(failed), len(modules))
+        print "Checked in %.3f seconds with %d file system calls." % (
+            time.time() - start, self._output_files.fs_calls)
+
+        if pruned_bp_path:
+            self.WritePrunedPackageList(pruned_package_list_path, failed)
+            with open(pruned_bp_path, "w") as f:
+                f.write(header)
+            blueprint.WriteModules(pruned_bp_path, dict(
+                (module.Get("name"), module) for module in modules
+                if module.Get("name") not in failed))
+        if failure_list_path:
+            types = dict((module.Get("name"), module.module_type)
+                         for module in modules)
+            with open(failure_list_path, "w") as f:
+                json.dump([{"name": name, "type": types[name],
+                            "reason": failed[name]}
+                           for name in sorted(failed)],
+                          f, indent=2, sort_keys=True)
+                f.write("\n")
+        return failed
+
+    def ReportStatusChanges(self):
+        """Print the modules which broke or got fixed since the previous
+           check of the product, and save the statuses of this one
+
+           Returns:
+               (broken, fixed) tuple of sorted lists of module names
+        """
+        broken = []
+        fixed = []
+        for name, status in self._statuses.iteritems():
+            previous = self._previous_statuses.get(name)
+            if previous is None:
+                continue
+            if previous[4] is None and status[4] is not None:
+                broken.append(name)
+            elif previous[4] is not None and status[4] is None:
+                fixed.append(name)
+        broken.sort()
+        fixed.sort()
+
+        print "%s: %d newly broken, %d newly fixed modules since the " \
+              "previous check" % (self._target_product, len(broken),
+                                  len(fixed))
+        for name in broken:
+            print "  Newly broken: %s (%s)" % (name, self._statuses[name][4])
+        for name in fixed:
+            print "  Newly fixed: " + name
+
+        if self._status_db is not None:
+            self._status_db.Save(self._target_product, self._statuses)
+        return broken, fixed
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -199,12 +690,77 @@ def main():
         dest='target_product',
         required=True,
         help='target product name, \
-                                such as "bullhead", "angler", etc.')
+                                such as "bullhead", "angler", etc. \
+                                Several products can be checked at once, \
+                                separated by commas.')
+    parser.add_argument(
+        '--no_index',
+        dest='use_index',
+        action='store_false',
+        help='check every module with its own file system call instead of '
+             'listing the output directory once')
+    parser.add_argument(
+        '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='number of threads listing the output directory, useful on '
+             'network file systems')
+    parser.add_argument(
+        '--blueprint',
+        dest='blueprint',
+        help='path of gen.bp, to also check the blueprint modules')
+    parser.add_argument(
+        '--pruned_blueprint',
+        dest='pruned_blueprint',
+        help='write gen.bp with only the successfully built modules to '
+             'this path, requires --pruned_package_list')
+    parser.add_argument(
+        '--pruned_package_list',
+        dest='pruned_package_list',
+        help='write ltp_package_list.mk without the failed blueprint modules '
+             'to this path. Android.mk requires all the packages of the list, '
+             'so it must replace ltp_package_list.mk whenever the pruned '
+             'gen.bp replaces gen.bp')
+    parser.add_argument(
+        '--failure_list',
+        dest='failure_list',
+        help='write the failed blueprint modules to this path as JSON')
+    parser.add_argument(
+        '--status_db',
+        dest='status_db',
+        help='SQLite database keeping the module statuses between checks, '
+             'to report the modules which broke or got fixed since')
     args = parser.parse_args()
-
-    checker = LtpModuleChecker(args.android_build_top, args.ltp_dir,
-                               args.target_product)
-    checker.CheckModules()
+    if args.pruned_blueprint and not args.pruned_package_list:
+        parser.error('--pruned_blueprint requires --pruned_package_list')
+
+    products = args.target_product.split(',')
+    status_db = StatusDatabase(args.status_db) if args.status_db else None
+    for product in products:
+        pruned_blueprint = args.pruned_blueprint
+        failure_list = args.failure_list
+        pruned_package_list = args.pruned_package_list
+        if len(products) > 1:
+            print "== " + product
+            # One output per product
+            if pruned_blueprint:
+                pruned_blueprint += '.' + product
+            if failure_list:
+                failure_list += '.' + product
+            if pruned_package_list:
+                pruned_package_list += '.' + product
+        checker = LtpModuleChecker(args.android_build_top, args.ltp_dir,
+                                   product, args.use_index, args.jobs,
+                                   status_db)
+        checker.CheckModules()
+        if args.blueprint:
+            checker.CheckBlueprint(args.blueprint, pruned_blueprint,
+                                   failure_list, pruned_package_list)
+        if status_db is not None:
+            checker.ReportStatusChanges()
+    if status_db is not None:
+        status_db.Close()
 
 
 if __name__ == '__main__':
@@ -30,11 +30,17 @@ and the naming convention.
 """
 
 import argparse
+import bisect
+import hashlib
+import json
 import os.path
 import re
 import sys
+import time
 import xml.etree.ElementTree as ET
 import subprocess
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 if "ANDROID_BUILD_TOP" not in os.environ:
   print ("Please set up your Android build environment by running "
@@ -61,11 +67,14 @@ arm_syscall_tbl = 'arch/arm/tools/syscall.tbl'
 x86_syscall_tbl = 'arch/x86/entry/syscalls/syscall_32.tbl'
 x86_64_syscall_tbl = 'arch/x86/entry/syscalls/syscall_64.tbl'
 
-unistd_h_url = src_url_start
-arm64_unistd32_h_url = src_url_start
-arm_syscall_tbl_url = src_url_start
-x86_syscall_tbl_url = src_url_start
-x86_64_syscall_tbl_url = src_url_start
+# Kernel files the CKI syscalls of all arches are read from.
+kernel_syscall_tables = [unistd_h, arm64_unistd32_h, arm_syscall_tbl,
+                         x86_syscall_tbl, x86_64_syscall_tbl]
+
+# Kernel version of the syscall tables at the tip of mainline, and the
+# lowest kernel version supported by Android, see the -k option.
+TIP_VERSION = "tip"
+MIN_KERNEL_VERSION = "4.9"
 
 # Syscalls which are either banned, optional, or deprecated, so not part of the
 # CKI.
@@ -134,6 +143,359 @@ EXTERNAL_TESTS = [ ("bpf", "libbpf_android/BpfLoadTest.cpp"),
                    ("seccomp", "kselftest/seccomp_bpf")
                  ]
 
+# Compat syscalls whose LTP tests are named after the syscall without the "32"
+# suffix, e.g. chown01 for chown32.
+COMPAT_SYSCALLS = [ "chown32", "fchown32", "getegid32", "geteuid32",
+        "getgid32", "getgroups32", "getresgid32", "getresuid32",
+        "getuid32", "lchown32", "setfsgid32", "setfsuid32", "setgid32",
+        "setgroups32", "setregid32", "setresgid32", "setresuid32",
+        "setreuid32", "setuid32"]
+
+# How the value of a special case matches a test name.
+MATCH_EXACT = "exact"    # the test name is one of the values
+MATCH_PREFIX = "prefix"  # the test name starts with the value
+MATCH_DIGITS = "digits"  # the test name is the value followed by digits
+
+# LTP tests which don't follow the naming convention of the syscall they
+# test. Syscall names are the ones without their "64" suffix, see
+# CKI_Coverage.match_syscalls_to_tests.
+LTP_SPECIAL_CASES = [
+        (("_llseek",), MATCH_PREFIX, "llseek"),
+        (("arm_fadvise64_", "fadvise64_"), MATCH_PREFIX, "posix_fadvise"),
+        (("arm_sync_file_range", "sync_file_range2"), MATCH_PREFIX,
+         "sync_file_range"),
+        (("clock_nanosleep",), MATCH_EXACT, ("clock_nanosleep2_01",)),
+        (("epoll_ctl", "epoll_create"), MATCH_EXACT, ("epoll-ltp",)),
+        (("futex",), MATCH_PREFIX, "futex_"),
+        (("get_thread_area",), MATCH_EXACT, ("set_thread_area01",)),
+        (("inotify_add_watch", "inotify_rm_watch"), MATCH_DIGITS, "inotify"),
+        (("inotify_init",), MATCH_EXACT,
+         ("inotify01", "inotify02", "inotify03", "inotify04")),
+        (("lsetxattr",), MATCH_PREFIX, "lgetxattr"),
+        (("newfstatat",), MATCH_DIGITS, "fstatat"),
+        (("prlimit", "ugetrlimit"), MATCH_EXACT, ("getrlimit03",)),
+        (("rt_sigtimedwait",), MATCH_EXACT, ("sigwaitinfo01",)),
+        (("shutdown",), MATCH_EXACT, ("send01", "sendmsg01", "sendto01")),
+] + [((syscall,), MATCH_DIGITS, syscall[0:-2]) for syscall in COMPAT_SYSCALLS]
+
+# Numeric suffix of the LTP tests named after a syscall, e.g. "01" or "_02".
+TEST_SUFFIX_RE = re.compile(r"^_?0?\d\d?$")
+# Longest suffix TEST_SUFFIX_RE matches.
+TEST_SUFFIX_MAX_LEN = 4
+
+
+# Status of a test of a CKI syscall, see CKI_Coverage.classify_tests.
+TEST_DISABLED = "disabled"    # not built, disabled or not stable in VTS
+TEST_EXTERNAL = "external"    # one of EXTERNAL_TESTS
+TEST_STABLE = "stable"        # stable in VTS
+TEST_MANDATORY = "mandatory"  # stable and mandatory in VTS
+
+
+class LtpTestIndex(object):
+  """Index of LTP test names to find the tests of a syscall.
+
+  Test names are split once into the stems they have before a numeric
+  suffix, so that the tests of a syscall are found with dictionary lookups
+  instead of matching every test name against regexes.
+  """
+
+  def __init__(self, full_test_names):
+    """Index tests.
+
+    Args:
+      full_test_names: List of "testsuite.test" names.
+    """
+    self._full_test_names = full_test_names
+    # Name before the numeric suffix, e.g. "open" for "open01", to positions
+    # in full_test_names.
+    self._stems = {}
+    # Name before trailing digits of any length, for MATCH_DIGITS.
+    self._digit_stems = {}
+    # Test name to positions, for MATCH_EXACT.
+    self._tests = {}
+    for position, full_test_name in enumerate(full_test_names):
+      test = full_test_name.split('.')[1]
+      self._tests.setdefault(test, []).append(position)
+      for length in range(1, min(TEST_SUFFIX_MAX_LEN, len(test) - 1) + 1):
+        if TEST_SUFFIX_RE.match(test[-length:]):
+          self._stems.setdefault(test[:-length], []).append(position)
+      stem = test.rstrip("0123456789")
+      if stem != test:
+        self._digit_stems.setdefault(stem, []).append(position)
+    # Sorted (test, position) tuples, for MATCH_PREFIX.
+    self._sorted_tests = sorted((test, position)
+                                for test, positions in self._tests.items()
+                                for position in positions)
+    self._special_cases = {}
+    for syscalls, kind, value in LTP_SPECIAL_CASES:
+      for syscall in syscalls:
+        self._special_cases.setdefault(syscall, []).append((kind, value))
+
+  def _prefixed(self, prefix):
+    start = bisect.bisect_left(self._sorted_tests, (prefix,))
+    positions = []
+    for test, position in self._sorted_tests[start:]:
+      if not test.startswith(prefix):
+        break
+      positions.append(position)
+    return positions
+
+  def tests(self, ltp_syscall_name):
+    """Find the tests of a syscall.
+
+    Args:
+      ltp_syscall_name: Name of the syscall without its "64" suffix.
+
+    Returns:
+      List of "testsuite.test" names, in the order they were indexed.
+    """
+    positions = set(self._stems.get(ltp_syscall_name, []))
+    for kind, value in self._special_cases.get(ltp_syscall_name, []):
+      if kind == MATCH_EXACT:
+        for test in value:
+          positions.update(self._tests.get(test, []))
+      elif kind == MATCH_PREFIX:
+        positions.update(self._prefixed(value))
+      elif kind == MATCH_DIGITS:
+        positions.update(self._digit_stems.get(value, []))
+    return [self._full_test_names[i] for i in sorted(positions)]
+
+
+# Bit of each arch in the flags of SyscallRegistry.
+ARCH_FLAGS = OrderedDict([("arm64", 1), ("arm", 2), ("x86_64", 4), ("x86", 8)])
+
+
+# Marks of the arches in the text view of the coverage matrix.
+ARCH_MARKS = {"arm64": "A", "arm": "a", "x86_64": "X", "x86": "x"}
+
+
+class SyscallRegistry(object):
+  """Syscalls and the arches they exist on.
+
+  Syscalls are kept in the order they were first added, with a bitmask of
+  ARCH_FLAGS per syscall, so that adding and removing syscalls doesn't
+  search or copy the list of syscalls.
+  """
+
+  def __init__(self):
+    self._flags = OrderedDict()
+
+  def add(self, name, arch):
+    """Note that a syscall exists on an arch of ARCH_FLAGS."""
+    self._flags[name] = self._flags.get(name, 0) | ARCH_FLAGS[arch]
+
+  def add_syscalls(self, syscalls):
+    """Add syscall structures as parsed by gensyscalls.
+
+    Args:
+      syscalls: List of dicts with the name of a syscall and True for each
+        arch it exists on.
+    """
+    for syscall in syscalls:
+      flags = self._flags.get(syscall["name"], 0)
+      for arch, flag in ARCH_FLAGS.items():
+        if syscall.get(arch):
+          flags |= flag
+      self._flags[syscall["name"]] = flags
+
+  def remove(self, name):
+    """Remove a syscall, if present."""
+    self._flags.pop(name, None)
+
+  def remove_all(self, names):
+    """Remove syscalls, if present."""
+    for name in names:
+      self._flags.pop(name, None)
+
+  def names(self):
+    """Return the names of the syscalls, in the order they were added."""
+    return list(self._flags)
+
+  def arches(self, name):
+    """Return the arches of ARCH_FLAGS a syscall exists on, in that order."""
+    flags = self._flags.get(name, 0)
+    return [arch for arch, flag in ARCH_FLAGS.items() if flags & flag]
+
+  def export(self):
+    """Return the syscalls in the order they were added.
+
+    Returns:
+      List of dicts with the "name" of a syscall and True for each arch it
+      exists on.
+    """
+    syscalls = []
+    for name, flags in self._flags.items():
+      syscall = {"name": name}
+      for arch, flag in ARCH_FLAGS.items():
+        if flags & flag:
+          syscall[arch] = True
+      syscalls.append(syscall)
+    return syscalls
+
+
+class SyscallTableSource(object):
+  """Reads the kernel syscall tables of a kernel version.
+
+  The tables are read from a kernel checkout, or from a snapshot directory
+  holding the tables of each kernel version, or else downloaded from
+  git.kernel.org. A snapshot directory has a subdirectory per kernel version
+  with a MANIFEST.json mapping the path of each table in the kernel to its
+  SHA-1, and the tables themselves named after their SHA-1. Tables missing
+  from a snapshot directory are only downloaded, and added to it, when
+  fetch is set, so that the tool can run offline.
+  """
+
+  MANIFEST = "MANIFEST.json"
+
+  def __init__(self, kernel_dir=None, snapshot_dir=None, fetch=False):
+    """Configure where the tables are read from.
+
+    Args:
+      kernel_dir: Kernel checkout to read the tables from, or None.
+      snapshot_dir: Snapshot directory to read the tables from, or None.
+        When a kernel_dir is also given, the tables read from it are added
+        to the snapshot directory under the version of the checkout.
+      fetch: Whether to download the tables missing from snapshot_dir.
+    """
+    self._kernel_dir = kernel_dir
+    self._snapshot_dir = snapshot_dir
+    self._fetch = fetch or snapshot_dir is None
+
+  @staticmethod
+  def url(version, path):
+    """Return the git.kernel.org URL of a kernel file."""
+    if version == TIP_VERSION:
+      return src_url_start + tip_url + path
+    return src_url_start + stable_url + path + "?h=v" + version
+
+  @staticmethod
+  def kernel_dir_version(kernel_dir):
+    """Return the "major.minor" version of a kernel checkout."""
+    fields = {}
+    with open(os.path.join(kernel_dir, "Makefile")) as fp:
+      for line in fp:
+        match = re.match(r"^(VERSION|PATCHLEVEL)\s*=\s*(\d+)", line)
+        if match:
+          fields[match.group(1)] = match.group(2)
+        if len(fields) == 2:
+          return "%s.%s" % (fields["VERSION"], fields["PATCHLEVEL"])
+    raise ValueError("no kernel version in %s/Makefile" % kernel_dir)
+
+  def _load_snapshot(self, version):
+    """Read the tables of a version from the snapshot directory.
+
+    Tables whose content doesn't match the SHA-1 of the manifest are
+    skipped.
+    """
+    tables = {}
+    version_dir = os.path.join(self._snapshot_dir, version)
+    try:
+      with open(os.path.join(version_dir, self.MANIFEST)) as fp:
+        manifest = json.load(fp)
+    except (IOError, ValueError):
+      return tables
+    for path, sha1 in manifest.items():
+      try:
+        with open(os.path.join(version_dir, sha1), "rb") as fp:
+          data = fp.read()
+      except IOError:
+        continue
+      if hashlib.sha1(data).hexdigest() == sha1:
+        tables[path] = data
+    return tables
+
+  def _store_snapshot(self, version, tables):
+    """Add tables to the snapshot directory."""
+    version_dir = os.path.join(self._snapshot_dir, version)
+    if not os.path.isdir(version_dir):
+      os.makedirs(version_dir)
+    manifest_path = os.path.join(version_dir, self.MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+      with open(manifest_path) as fp:
+        manifest = json.load(fp)
+    for path, data in tables.items():
+      sha1 = hashlib.sha1(data).hexdigest()
+      with open(os.path.join(version_dir, sha1), "wb") as fp:
+        fp.write(data)
+      manifest[path] = sha1
+    with open(manifest_path, "w") as fp:
+      json.dump(manifest, fp, indent=2, sort_keys=True)
+
+  @classmethod
+  def _download(cls, item):
+    version, path = item
+    url = cls.url(version, path)
+    proc = subprocess.Popen(["curl", "--silent", "--fail", url],
+                            stdout=subprocess.PIPE)
+    data, _ = proc.communicate()
+    if proc.returncode:
+      raise IOError("curl %s failed with %d" % (url, proc.returncode))
+    return data
+
+  def read_tables(self, versions):
+    """Read the syscall tables of kernel versions.
+
+    Missing tables of all versions are downloaded at once.
+
+    Args:
+      versions: List of kernel versions, e.g. TIP_VERSION or "4.9". A
+        kernel checkout is read for TIP_VERSION and for its own version.
+
+    Returns:
+      Dict of version to dict of path in kernel_syscall_tables to the
+      list of lines of the table.
+
+    Raises:
+      IOError: If a table is missing and can't be downloaded, or if the
+        kernel checkout is not of a requested version.
+    """
+    tables = {}
+    if self._kernel_dir is not None:
+      checkout_version = self.kernel_dir_version(self._kernel_dir)
+      for version in versions:
+        if version not in (TIP_VERSION, checkout_version):
+          raise IOError("%s is kernel version %s, not %s" %
+                        (self._kernel_dir, checkout_version, version))
+      checkout = {}
+      for path in kernel_syscall_tables:
+        with open(os.path.join(self._kernel_dir, path), "rb") as fp:
+          checkout[path] = fp.read()
+      if self._snapshot_dir is not None:
+        self._store_snapshot(checkout_version, checkout)
+      for version in versions:
+        tables[version] = checkout
+    else:
+      for version in versions:
+        tables[version] = (self._load_snapshot(version)
+                           if self._snapshot_dir is not None else {})
+      missing = [(version, path) for version in versions
+                 for path in kernel_syscall_tables
+                 if path not in tables[version]]
+      if missing and not self._fetch:
+        raise IOError("missing syscall tables, run with --fetch: %s" %
+                      ", ".join("%s (%s)" % (path, version)
+                                for version, path in missing))
+      if missing:
+        pool = ThreadPool(len(missing))
+        try:
+          downloads = pool.map(self._download, missing)
+        finally:
+          pool.close()
+          pool.join()
+        fetched = {}
+        for (version, path), data in zip(missing, downloads):
+          tables[version][path] = data
+          fetched.setdefault(version, {})[path] = data
+        if self._snapshot_dir is not None:
+          for version, version_tables in fetched.items():
+            self._store_snapshot(version, version_tables)
+    return dict((version,
+                 dict((path, data.decode("utf-8").splitlines())
+                      for path, data in version_tables.items()))
+                for version, version_tables in tables.items())
+
+
 class CKI_Coverage(object):
   """Determines current test coverage of CKI system calls in LTP.
 
@@ -165,6 +527,8 @@ class CKI_Coverage(object):
 
   syscall_tests = {}
   disabled_tests = {}
+  test_status = {}
+  syscall_status = {}
 
   def __init__(self, arch):
     self._arch = arch
@@ -204,7 +568,8 @@ class CKI_Coverage(object):
     """Detect special cases in syscall to LTP mapping.
 
     Most syscall tests in LTP follow a predictable naming
-    convention, but some do not. Detect known special cases.
+    convention, but some do not. Detect known special cases, see
+    LTP_SPECIAL_CASES.
 
     Args:
       syscall: The name of a syscall.
@@ -214,54 +579,86 @@ class CKI_Coverage(object):
       A boolean indicating whether the given syscall is tested
       by the given testcase.
     """
-    compat_syscalls = [ "chown32", "fchown32", "getegid32", "geteuid32",
-            "getgid32", "getgroups32", "getresgid32", "getresuid32",
-            "getuid32", "lchown32", "setfsgid32", "setfsuid32", "setgid32",
-            "setgroups32", "setregid32", "setresgid32", "setresuid32",
-            "setreuid32", "setuid32"]
-    if syscall in compat_syscalls:
-        test_re = re.compile(r"^%s\d+$" % syscall[0:-2])
-        if re.match(test_re, test):
-            return True
-    if syscall == "_llseek" and test.startswith("llseek"):
-      return True
-    if syscall in ("arm_fadvise64_", "fadvise64_") and \
-      test.startswith("posix_fadvise"):
-      return True
-    if syscall in ("arm_sync_file_range", "sync_file_range2") and \
-      test.startswith("sync_file_range"):
-      return True
-    if syscall == "clock_nanosleep" and test == "clock_nanosleep2_01":
-      return True
-    if syscall in ("epoll_ctl", "epoll_create") and test == "epoll-ltp":
-      return True
-    if syscall == "futex" and test.startswith("futex_"):
-      return True
-    if syscall == "get_thread_area" and test == "set_thread_area01":
-      return True
-    if syscall == "inotify_add_watch" or syscall == "inotify_rm_watch":
-      test_re = re.compile(r"^inotify\d+$")
-      if re.match(test_re, test):
-        return True
-    inotify_init_tests = [ "inotify01", "inotify02", "inotify03", "inotify04" ]
-    if syscall == "inotify_init" and test in inotify_init_tests:
-        return True
-    if syscall == "lsetxattr" and test.startswith("lgetxattr"):
+    for syscalls, kind, value in LTP_SPECIAL_CASES:
+      if syscall not in syscalls:
+        continue
+      if kind == MATCH_EXACT and test in value:
         return True
-    if syscall == "newfstatat":
-      test_re = re.compile(r"^fstatat\d+$")
-      if re.match(test_re, test):
+      if kind == MATCH_PREFIX and test.startswith(value):
         return True
-    if syscall in ("prlimit", "ugetrlimit") and test == "getrlimit03":
-      return True
-    if syscall == "rt_sigtimedwait" and test == "sigwaitinfo01":
-      return True
-    shutdown_tests = [ "send01", "sendmsg01", "sendto01" ]
-    if syscall == "shutdown" and test in shutdown_tests:
+      if (kind == MATCH_DIGITS and test.startswith(value) and
+          test[len(value):].isdigit()):
         return True
 
     return False
 
+  def ltp_tests_by_regex(self, ltp_syscall_name):
+    """Find the LTP tests of a syscall by matching every test name.
+
+    This is how syscalls used to be matched to tests, kept to check and
+    benchmark LtpTestIndex against, see the --benchmark option.
+
+    Args:
+      ltp_syscall_name: Name of the syscall without its "64" suffix.
+
+    Returns:
+      List of "testsuite.test" names.
+    """
+    # Most LTP syscalls have source files for the tests that follow
+    # a naming convention in the regexp below. Exceptions exist though.
+    # For now those are checked for specifically.
+    test_re = re.compile(r"^%s_?0?\d\d?$" % ltp_syscall_name)
+    tests = []
+    for full_test_name in self.ltp_full_set:
+      testsuite, test = full_test_name.split('.')
+      if (re.match(test_re, test) or
+          self.ltp_test_special_cases(ltp_syscall_name, test)):
+        tests.append(full_test_name)
+    return tests
+
+  def find_syscall_tests(self, syscall_names, use_index=True):
+    """Find the tests of syscalls.
+
+    Args:
+      syscall_names: List of syscall names.
+      use_index: Whether to look tests up in an LtpTestIndex of
+        ltp_full_set instead of matching every test name.
+
+    Returns:
+      Dict of syscall name to list of test names, including the
+      EXTERNAL_TESTS.
+    """
+    if use_index:
+      ltp_test_index = LtpTestIndex(self.ltp_full_set)
+    syscall_tests = {}
+    for name in syscall_names:
+      # LTP does not use the 64 at the end of syscall names for testcases.
+      ltp_syscall_name = name
+      if ltp_syscall_name.endswith("64"):
+        ltp_syscall_name = ltp_syscall_name[0:-2]
+      if use_index:
+        tests = ltp_test_index.tests(ltp_syscall_name)
+      else:
+        tests = self.ltp_tests_by_regex(ltp_syscall_name)
+      syscall_tests[name] = []
+      for full_test_name in tests:
+        testsuite = full_test_name.split('.')[0]
+        # The filenames of the ioctl tests in LTP do not match the name
+        # of the testcase defined in that source, which is what shows
+        # up in VTS.
+        if testsuite == "syscalls" and ltp_syscall_name == "ioctl":
+          full_test_name = "syscalls.ioctl01_02"
+        # Likewise LTP has a test named epoll01, which is built as an
+        # executable named epoll-ltp, and tests the epoll_{create,ctl}
+        # syscalls.
+        if full_test_name == "syscalls.epoll-ltp":
+          full_test_name = "syscalls.epoll01"
+        syscall_tests[name].append(full_test_name)
+      for e in EXTERNAL_TESTS:
+        if e[0] == name:
+          syscall_tests[name].append(e[1])
+    return syscall_tests
+
   def match_syscalls_to_tests(self, syscalls):
     """Match syscalls with tests in LTP.
 
@@ -277,57 +674,115 @@ class CKI_Coverage(object):
       if self._arch is not None and self._arch not in syscall:
         continue
       self.cki_syscalls.append(syscall)
-      self.syscall_tests[syscall["name"]] = []
-      # LTP does not use the 64 at the end of syscall names for testcases.
-      ltp_syscall_name = syscall["name"]
-      if ltp_syscall_name.endswith("64"):
-        ltp_syscall_name = ltp_syscall_name[0:-2]
-      # Most LTP syscalls have source files for the tests that follow
-      # a naming convention in the regexp below. Exceptions exist though.
-      # For now those are checked for specifically.
-      test_re = re.compile(r"^%s_?0?\d\d?$" % ltp_syscall_name)
-      for full_test_name in self.ltp_full_set:
-        testsuite, test = full_test_name.split('.')
-        if (re.match(test_re, test) or
-            self.ltp_test_special_cases(ltp_syscall_name, test)):
-          # The filenames of the ioctl tests in LTP do not match the name
-          # of the testcase defined in that source, which is what shows
-          # up in VTS.
-          if testsuite == "syscalls" and ltp_syscall_name == "ioctl":
-            full_test_name = "syscalls.ioctl01_02"
-          # Likewise LTP has a test named epoll01, which is built as an
-          # executable named epoll-ltp, and tests the epoll_{create,ctl}
-          # syscalls.
-          if full_test_name == "syscalls.epoll-ltp":
-            full_test_name = "syscalls.epoll01"
-          self.syscall_tests[syscall["name"]].append(full_test_name)
-      for e in EXTERNAL_TESTS:
-        if e[0] == syscall["name"]:
-          self.syscall_tests[syscall["name"]].append(e[1])
+    self.syscall_tests.update(self.find_syscall_tests(
+        [syscall["name"] for syscall in self.cki_syscalls]))
     self.cki_syscalls.sort(key=lambda tup: tup["name"])
 
+  def benchmark_matchers(self, syscalls):
+    """Time matching syscalls to tests with and without LtpTestIndex.
+
+    Args:
+      syscalls: List of syscall structures containing all syscalls
+        in the CKI.
+
+    Returns:
+      True if both matchers found the same tests.
+    """
+    names = [syscall["name"] for syscall in syscalls
+             if self._arch is None or self._arch in syscall]
+    start = time.time()
+    by_regex = self.find_syscall_tests(names, use_index=False)
+    regex_seconds = time.time() - start
+    start = time.time()
+    by_index = self.find_syscall_tests(names)
+    index_seconds = time.time() - start
+    print ("Matched %d syscalls to %d LTP tests" %
+           (len(names), len(self.ltp_full_set)))
+    print "  regex matcher: %.3fs" % regex_seconds
+    print "  index matcher: %.3fs (%.0fx)" % (
+        index_seconds, regex_seconds / max(index_seconds, 1e-9))
+    same = by_regex == by_index
+    if not same:
+      for name in names:
+        if by_regex[name] != by_index[name]:
+          print "  mismatch for %s: %s != %s" % (name, by_regex[name],
+                                                 by_index[name])
+    return same
+
+  def classify_tests(self, full_test_names):
+    """Classify tests by their configuration in LTP and VTS.
+
+    Args:
+      full_test_names: Iterable of test names, "testsuite.test" for LTP
+        tests or the path of an EXTERNAL_TESTS test.
+
+    Returns:
+      Dict of test name to TEST_DISABLED, TEST_EXTERNAL, TEST_STABLE or
+      TEST_MANDATORY.
+    """
+    external = frozenset(t[1] for t in EXTERNAL_TESTS)
+    disabled_in_ltp = frozenset(self.disabled_in_ltp)
+    disabled_in_vts_ltp = frozenset(self.disabled_in_vts_ltp)
+    # The VTS LTP stable list is composed of tuples of the test name and
+    # a boolean flag indicating whether it is mandatory.
+    mandatory_in_vts_ltp = {}
+    for name, mandatory in self.stable_in_vts_ltp:
+      mandatory_in_vts_ltp[name] = (mandatory or
+                                    mandatory_in_vts_ltp.get(name, False))
+
+    status = {}
+    for full_test_name in full_test_names:
+      if full_test_name in status:
+        continue
+      if full_test_name in external:
+        status[full_test_name] = TEST_EXTERNAL
+        continue
+      _, test = full_test_name.split('.')
+      bits = ["%s_%s" % (full_test_name, i) for i in ("32bit", "64bit")]
+      if (test in disabled_in_ltp or full_test_name in disabled_in_vts_ltp or
+          not any(i in mandatory_in_vts_ltp for i in bits)):
+        status[full_test_name] = TEST_DISABLED
+      elif any(mandatory_in_vts_ltp.get(i) for i in bits):
+        status[full_test_name] = TEST_MANDATORY
+      else:
+        status[full_test_name] = TEST_STABLE
+    return status
+
   def update_test_status(self):
     """Populate test configuration and output for all CKI syscalls.
 
     Go through VTS test configuration to populate data for all CKI syscalls.
+    Every test is classified once, then the statuses of the tests of each
+    syscall are counted into syscall_status.
     """
+    self.test_status = self.classify_tests(
+        full_test_name for syscall in self.cki_syscalls
+        for full_test_name in self.syscall_tests[syscall["name"]])
     for syscall in self.cki_syscalls:
-      self.disabled_tests[syscall["name"]] = []
-      if not self.syscall_tests[syscall["name"]]:
-        continue
-      for full_test_name in self.syscall_tests[syscall["name"]]:
-        if full_test_name in [t[1] for t in EXTERNAL_TESTS]:
-          continue
-        _, test = full_test_name.split('.')
-        # The VTS LTP stable list is composed of tuples of the test name and
-        # a boolean flag indicating whether it is mandatory.
-        stable_vts_ltp_testnames = [i[0] for i in self.stable_in_vts_ltp]
-        if (test in self.disabled_in_ltp or
-            full_test_name in self.disabled_in_vts_ltp or
-            ("%s_32bit" % full_test_name not in stable_vts_ltp_testnames and
-             "%s_64bit" % full_test_name not in stable_vts_ltp_testnames)):
-          self.disabled_tests[syscall["name"]].append(full_test_name)
-          continue
+      tests = self.syscall_tests[syscall["name"]]
+      statuses = [self.test_status[i] for i in tests]
+      self.disabled_tests[syscall["name"]] = [
+          i for i, status in zip(tests, statuses) if status == TEST_DISABLED]
+      disabled = len(self.disabled_tests[syscall["name"]])
+      self.syscall_status[syscall["name"]] = {
+          "disabled": disabled,
+          "enabled": len(tests) - disabled,
+          "stable": sum(1 for i in statuses
+                        if i in (TEST_STABLE, TEST_MANDATORY)),
+          "mandatory": statuses.count(TEST_MANDATORY),
+      }
+
+  def output_status_table(self):
+    """Print the status of the tests of every CKI syscall as CSV."""
+    arches = ("arm64", "arm", "x86_64", "x86")
+    print ",".join(("syscall", "disabled", "enabled", "stable", "mandatory") +
+                   arches)
+    for syscall in self.cki_syscalls:
+      status = self.syscall_status[syscall["name"]]
+      print ",".join([syscall["name"]] +
+                     [str(status[i]) for i in ("disabled", "enabled",
+                                               "stable", "mandatory")] +
+                     [str(int(bool(syscall.get(i)))) for i in arches])
 
   def syscall_arch_string(self, syscall, arch):
     """Return a string showing whether the arch supports the given syscall."""
@@ -344,20 +799,19 @@ class CKI_Coverage(object):
     print ""
     print "         Covered Syscalls"
     for syscall in self.cki_syscalls:
-      if (len(self.syscall_tests[syscall["name"]]) -
-          len(self.disabled_tests[syscall["name"]]) <= 0):
+      status = self.syscall_status[syscall["name"]]
+      if status["enabled"] <= 0:
         continue
       if not count % 20:
         print ("%25s   Disabled Enabled arm64 arm x86_64 x86 -----------" %
                "-------------")
-      enabled = (len(self.syscall_tests[syscall["name"]]) -
-                 len(self.disabled_tests[syscall["name"]]))
+      enabled = status["enabled"]
       if enabled > 9:
         column_sp = "      "
       else:
         column_sp = "       "
       sys.stdout.write("%25s   %s        %s%s%s     %s   %s      %s\n" %
-                       (syscall["name"], len(self.disabled_tests[syscall["name"]]),
+                       (syscall["name"], status["disabled"],
                         enabled, column_sp,
                         self.syscall_arch_string(syscall, "arm64"),
                         self.syscall_arch_string(syscall, "arm"),
@@ -369,20 +823,19 @@ class CKI_Coverage(object):
     print "\n"
     print "       Uncovered Syscalls"
     for syscall in self.cki_syscalls:
-      if (len(self.syscall_tests[syscall["name"]]) -
-          len(self.disabled_tests[syscall["name"]]) > 0):
+      status = self.syscall_status[syscall["name"]]
+      if status["enabled"] > 0:
         continue
       if not count % 20:
         print ("%25s   Disabled Enabled arm64 arm x86_64 x86 -----------" %
                "-------------")
-      enabled = (len(self.syscall_tests[syscall["name"]]) -
-                 len(self.disabled_tests[syscall["name"]]))
+      enabled = status["enabled"]
       if enabled > 9:
         column_sp = "      "
       else:
         column_sp = "       "
       sys.stdout.write("%25s   %s        %s%s%s     %s   %s      %s\n" %
-                       (syscall["name"], len(self.disabled_tests[syscall["name"]]),
+                       (syscall["name"], status["disabled"],
                         enabled, column_sp,
                         self.syscall_arch_string(syscall, "arm64"),
                         self.syscall_arch_string(syscall, "arm"),
@@ -404,10 +857,10 @@ class CKI_Coverage(object):
     uncovered_with_test = 0
     uncovered_without_test = 0
     for syscall in self.cki_syscalls:
-      if (len(self.syscall_tests[syscall["name"]]) -
-          len(self.disabled_tests[syscall["name"]]) > 0):
+      status = self.syscall_status[syscall["name"]]
+      if status["enabled"] > 0:
         continue
-      if (len(self.disabled_tests[syscall["name"]]) > 0):
+      if status["disabled"] > 0:
         uncovered_with_test += 1
       else:
         uncovered_without_test += 1
@@ -417,115 +870,196 @@ class CKI_Coverage(object):
                                 uncovered_with_test, uncovered_without_test,
                                 uncovered_with_test + uncovered_without_test))
 
-  def add_syscall(self, cki, syscall, arch):
-    """Note that a syscall has been seen for a particular arch."""
-    seen = False
-    for s in cki.syscalls:
-      if s["name"] == syscall:
-        s[arch]= True
-        seen = True
-        break
-    if not seen:
-      cki.syscalls.append({"name":syscall, arch:True})
-
-  def delete_syscall(self, cki, syscall):
-    cki.syscalls = list(filter(lambda i: i["name"] != syscall, cki.syscalls))
-
-  def check_blacklist(self, cki, error_on_match):
-    unlisted_syscalls = []
-    for s in cki.syscalls:
-      if s["name"] in CKI_BLACKLIST:
-        if error_on_match:
-          print "Syscall %s found in both bionic CKI and blacklist!" % s["name"]
-          sys.exit()
+  def coverage_matrix(self, registries, arches):
+    """Compute the CKI syscall coverage of several kernel versions.
+
+    The LTP tests are matched and classified once for the syscalls of all
+    versions, then every (version, arch) cell is counted in a single pass
+    over the syscalls.
+
+    Args:
+      registries: OrderedDict of kernel version to the SyscallRegistry of
+        its CKI syscalls.
+      arches: List of arches of ARCH_FLAGS to compute the coverage of.
+
+    Returns:
+      Dict with the "versions" and "arches" of the matrix, a "summary" list
+      with the counts of output_summary for each (version, arch), and a
+      "syscalls" list with the test statuses of each syscall and the arches
+      it exists on in each version.
+    """
+    names = set()
+    for registry in registries.values():
+      names.update(registry.names())
+    self.match_syscalls_to_tests([{"name": name} for name in names])
+    self.update_test_status()
+
+    summary = OrderedDict()
+    for version in registries:
+      for arch in arches:
+        summary[(version, arch)] = {
+            "version": version,
+            "arch": arch,
+            "cki_syscalls": 0,
+            "uncovered_with_disabled_tests": 0,
+            "uncovered_without_tests": 0,
+            "total_uncovered": 0,
+        }
+    syscalls = []
+    for syscall in self.cki_syscalls:
+      status = self.syscall_status[syscall["name"]]
+      if status["enabled"] > 0:
+        uncovered = None
+      elif status["disabled"] > 0:
+        uncovered = "uncovered_with_disabled_tests"
       else:
-        unlisted_syscalls.append(s)
-    cki.syscalls = unlisted_syscalls
+        uncovered = "uncovered_without_tests"
+      present = OrderedDict()
+      for version, registry in registries.items():
+        present[version] = [i for i in registry.arches(syscall["name"])
+                            if i in arches]
+        for arch in present[version]:
+          cell = summary[(version, arch)]
+          cell["cki_syscalls"] += 1
+          if uncovered:
+            cell[uncovered] += 1
+            cell["total_uncovered"] += 1
+      if not any(present.values()):
+        continue
+      row = OrderedDict([("name", syscall["name"])])
+      row.update(status)
+      row["arches"] = present
+      syscalls.append(row)
+    return {
+        "versions": list(registries),
+        "arches": list(arches),
+        "summary": list(summary.values()),
+        "syscalls": syscalls,
+    }
+
+  def output_matrix(self, matrix, output_format):
+    """Print a matrix returned by coverage_matrix.
 
-  def get_x86_64_kernel_syscalls(self, cki):
+    Args:
+      matrix: Dict returned by coverage_matrix.
+      output_format: "text", "csv" or "json".
+    """
+    cells = [(version, arch) for version in matrix["versions"]
+             for arch in matrix["arches"]]
+    if output_format == "json":
+      print json.dumps(matrix, indent=2, separators=(",", ": "))
+      return
+    if output_format == "csv":
+      print ",".join(["syscall", "disabled", "enabled", "stable",
+                      "mandatory"] + ["%s:%s" % cell for cell in cells])
+      for row in matrix["syscalls"]:
+        print ",".join([row["name"]] +
+                       [str(row[i]) for i in ("disabled", "enabled",
+                                              "stable", "mandatory")] +
+                       [str(int(arch in row["arches"][version]))
+                        for version, arch in cells])
+      return
+
+    print ("version, arch, cki syscalls, uncovered with disabled test(s), "
+           "uncovered with no tests, total uncovered")
+    for cell in matrix["summary"]:
+      print ("%s, %s, %s, %s, %s, %s" %
+             (cell["version"], cell["arch"], cell["cki_syscalls"],
+              cell["uncovered_with_disabled_tests"],
+              cell["uncovered_without_tests"], cell["total_uncovered"]))
+    print ""
+    print "Arches of each syscall per kernel version: %s" % " ".join(
+        "%s=%s" % (arch, ARCH_MARKS[arch]) for arch in matrix["arches"])
+    column = max(len(matrix["arches"]), max(len(i)
+                                            for i in matrix["versions"]))
+    header = ("%25s   Disabled Enabled   %s" %
+              ("-------------", " ".join("%-*s" % (column, version)
+                                         for version in matrix["versions"])))
+    for count, row in enumerate(matrix["syscalls"]):
+      if not count % 20:
+        print header
+      print ("%25s   %-8s %-7s   %s" %
+             (row["name"], row["disabled"], row["enabled"],
+              " ".join("%-*s" % (column, "".join(
+                  ARCH_MARKS[arch] if arch in row["arches"][version] else "."
+                  for arch in matrix["arches"]))
+                       for version in matrix["versions"])))
+
+  def check_blacklist(self, registry, error_on_match):
+    """Remove the syscalls of CKI_BLACKLIST from a SyscallRegistry."""
+    if error_on_match:
+      for name in registry.names():
+        if name in CKI_BLACKLIST:
+          print "Syscall %s found in both bionic CKI and blacklist!" % name
+          sys.exit()
+    registry.remove_all(CKI_BLACKLIST)
+
+  def get_x86_64_kernel_syscalls(self, registry, tables):
     """Retrieve the list of syscalls for x86_64."""
-    proc = subprocess.Popen(['curl', x86_64_syscall_tbl_url], stdout=subprocess.PIPE)
-    while True:
-      line = proc.stdout.readline()
-      if line != b'':
-        test_re = re.compile(r"^\d+\s+\w+\s+(\w+)\s+(__x64_sys|__x32_compat_sys)")
-        test_match = re.match(test_re, line)
-        if test_match:
-          syscall = test_match.group(1)
-          self.add_syscall(cki, syscall, "x86_64")
-      else:
-        break
+    test_re = re.compile(r"^\d+\s+\w+\s+(\w+)\s+(__x64_sys|__x32_compat_sys)")
+    for line in tables[x86_64_syscall_tbl]:
+      test_match = re.match(test_re, line)
+      if test_match:
+        syscall = test_match.group(1)
+        registry.add(syscall, "x86_64")
 
-  def get_x86_kernel_syscalls(self, cki):
+  def get_x86_kernel_syscalls(self, registry, tables):
     """Retrieve the list of syscalls for x86."""
-    proc = subprocess.Popen(['curl', x86_syscall_tbl_url], stdout=subprocess.PIPE)
-    while True:
-      line = proc.stdout.readline()
-      if line != b'':
-        test_re = re.compile(r"^\d+\s+i386\s+(\w+)\s+sys_")
-        test_match = re.match(test_re, line)
-        if test_match:
-          syscall = test_match.group(1)
-          self.add_syscall(cki, syscall, "x86")
-      else:
-        break
+    test_re = re.compile(r"^\d+\s+i386\s+(\w+)\s+sys_")
+    for line in tables[x86_syscall_tbl]:
+      test_match = re.match(test_re, line)
+      if test_match:
+        syscall = test_match.group(1)
+        registry.add(syscall, "x86")
 
-  def get_arm_kernel_syscalls(self, cki):
+  def get_arm_kernel_syscalls(self, registry, tables):
     """Retrieve the list of syscalls for arm."""
-    proc = subprocess.Popen(['curl', arm_syscall_tbl_url], stdout=subprocess.PIPE)
-    while True:
-      line = proc.stdout.readline()
-      if line != b'':
-        test_re = re.compile(r"^\d+\s+\w+\s+(\w+)\s+sys_")
-        test_match = re.match(test_re, line)
-        if test_match:
-          syscall = test_match.group(1)
-          self.add_syscall(cki, syscall, "arm")
-      else:
-        break
+    test_re = re.compile(r"^\d+\s+\w+\s+(\w+)\s+sys_")
+    for line in tables[arm_syscall_tbl]:
+      test_match = re.match(test_re, line)
+      if test_match:
+        syscall = test_match.group(1)
+        registry.add(syscall, "arm")
 
-  def get_arm64_kernel_syscalls(self, cki):
+  def get_arm64_kernel_syscalls(self, registry, tables):
     """Retrieve the list of syscalls for arm64."""
+    test_re = re.compile(r"^#define __NR(3264)?_(\w+)\s+(\d+)$")
     # Add AArch64 syscalls
-    proc = subprocess.Popen(['curl', unistd_h_url], stdout=subprocess.PIPE)
-    while True:
-      line = proc.stdout.readline()
-      if line != b'':
-        test_re = re.compile(r"^#define __NR(3264)?_(\w+)\s+(\d+)$")
-        test_match = re.match(test_re, line)
-        if test_match:
-          syscall = test_match.group(2)
-          if (syscall == "sync_file_range2" or
-              syscall == "arch_specific_syscall" or
-              syscall == "syscalls"):
-              continue
-          self.add_syscall(cki, syscall, "arm64")
-      else:
-        break
+    for line in tables[unistd_h]:
+      test_match = re.match(test_re, line)
+      if test_match:
+        syscall = test_match.group(2)
+        if (syscall == "sync_file_range2" or
+            syscall == "arch_specific_syscall" or
+            syscall == "syscalls"):
+            continue
+        registry.add(syscall, "arm64")
     # Add AArch32 syscalls
-    proc = subprocess.Popen(['curl', arm64_unistd32_h_url], stdout=subprocess.PIPE)
-    while True:
-      line = proc.stdout.readline()
-      if line != b'':
-        test_re = re.compile(r"^#define __NR(3264)?_(\w+)\s+(\d+)$")
-        test_match = re.match(test_re, line)
-        if test_match:
-          syscall = test_match.group(2)
-          self.add_syscall(cki, syscall, "arm64")
-      else:
-        break
+    for line in tables[arm64_unistd32_h]:
+      test_match = re.match(test_re, line)
+      if test_match:
+        syscall = test_match.group(2)
+        registry.add(syscall, "arm64")
+
+  def get_kernel_syscalls(self, registry, arch, tables):
+    """Retrieve the syscalls of all arches.
 
-  def get_kernel_syscalls(self, cki, arch):
-    self.get_arm64_kernel_syscalls(cki)
-    self.get_arm_kernel_syscalls(cki)
-    self.get_x86_kernel_syscalls(cki)
-    self.get_x86_64_kernel_syscalls(cki)
+    Args:
+      registry: SyscallRegistry to add the syscalls to.
+      arch: Unused, the syscalls of all arches are retrieved.
+      tables: Dict of path in kernel_syscall_tables to the list of lines
+        of the table, see SyscallTableSource.read_tables.
+    """
+    self.get_arm64_kernel_syscalls(registry, tables)
+    self.get_arm_kernel_syscalls(registry, tables)
+    self.get_x86_kernel_syscalls(registry, tables)
+    self.get_x86_64_kernel_syscalls(registry, tables)
 
     # restart_syscall is a special syscall which the kernel issues internally
     # when a process is resumed with SIGCONT.  seccomp whitelists this syscall,
     # but it is not part of the CKI or meaningfully testable from userspace.
     # See restart_syscall(2) for more details.
-    self.delete_syscall(cki, "restart_syscall")
+    registry.remove("restart_syscall")
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description="Output list of system calls "
@@ -539,6 +1073,28 @@ if __name__ == "__main__":
                       help="only check syscalls with known Android use")
   parser.add_argument("-k", action="store_true",
                       help="use lowest supported kernel version instead of tip")
+  parser.add_argument("-t", action="store_true",
+                      help="print the number of disabled, enabled, stable "
+                      "and mandatory tests of every CKI syscall as CSV")
+  parser.add_argument("--kernel_dir",
+                      help="read the syscall tables from this kernel "
+                      "checkout instead of git.kernel.org")
+  parser.add_argument("--snapshot_dir",
+                      help="read the syscall tables from this snapshot "
+                      "directory instead of git.kernel.org, see "
+                      "SyscallTableSource")
+  parser.add_argument("--fetch", action="store_true",
+                      help="download the syscall tables missing from "
+                      "--snapshot_dir and add them to it")
+  parser.add_argument("--matrix",
+                      help="comma separated kernel versions, e.g. "
+                      "\"tip,4.9,4.14\", to print the CKI coverage of all "
+                      "of them for all arches, or --arch, in one table")
+  parser.add_argument("--matrix_format", choices=("text", "csv", "json"),
+                      default="text", help="format of the --matrix table")
+  parser.add_argument("--benchmark", action="store_true",
+                      help="time matching the syscalls to LTP tests with and "
+                      "without an index of the tests, and check both agree")
 
   args = parser.parse_args()
   if args.arch is not None and args.arch not in gensyscalls.all_arches:
@@ -546,47 +1102,79 @@ if __name__ == "__main__":
     print gensyscalls.all_arches
     exit(-1)
 
+  if args.matrix:
+    if args.f or args.k or args.kernel_dir:
+      print "--matrix reads the kernel tables of the versions it is given"
+      exit(-1)
+    versions = args.matrix.split(",")
+    source = SyscallTableSource(None, args.snapshot_dir, args.fetch)
+    try:
+      tables = source.read_tables(versions)
+    except IOError as e:
+      print e
+      sys.exit(-1)
+    cki_cov = CKI_Coverage(None)
+    registries = OrderedDict()
+    for version in versions:
+      registries[version] = SyscallRegistry()
+      cki_cov.get_kernel_syscalls(registries[version], None, tables[version])
+      cki_cov.check_blacklist(registries[version], False)
+    cki_cov.load_ltp_tests()
+    cki_cov.load_ltp_disabled_tests()
+    matrix = cki_cov.coverage_matrix(
+        registries, [args.arch] if args.arch else list(ARCH_FLAGS))
+    cki_cov.output_matrix(matrix, args.matrix_format)
+    exit(0)
+
   if args.k:
-    minversion = "4.9"
-    print "Checking kernel version %s" % minversion
-    minversion = "?h=v" + minversion
-    unistd_h_url += stable_url + unistd_h + minversion
-    arm64_unistd32_h_url += stable_url + arm64_unistd32_h + minversion
-    arm_syscall_tbl_url += stable_url + arm_syscall_tbl + minversion
-    x86_syscall_tbl_url += stable_url + x86_syscall_tbl + minversion
-    x86_64_syscall_tbl_url += stable_url + x86_64_syscall_tbl + minversion
+    version = MIN_KERNEL_VERSION
+    # Keep the -t output valid CSV.
+    print >> (sys.stderr if args.t else sys.stdout), (
+        "Checking kernel version %s" % version)
   else:
-    unistd_h_url += tip_url + unistd_h
-    arm64_unistd32_h_url += tip_url + arm64_unistd32_h
-    arm_syscall_tbl_url += tip_url + arm_syscall_tbl
-    x86_syscall_tbl_url += tip_url + x86_syscall_tbl
-    x86_64_syscall_tbl_url += tip_url + x86_64_syscall_tbl
+    version = TIP_VERSION
 
-  cki = gensyscalls.SysCallsTxtParser()
+  registry = SyscallRegistry()
   cki_cov = CKI_Coverage(args.arch)
 
   if args.f:
+    cki = gensyscalls.SysCallsTxtParser()
     cki.parse_file(os.path.join(bionic_libc_root, "SYSCALLS.TXT"))
     cki.parse_file(os.path.join(bionic_libc_root, "SECCOMP_WHITELIST_APP.TXT"))
     cki.parse_file(os.path.join(bionic_libc_root, "SECCOMP_WHITELIST_COMMON.TXT"))
     cki.parse_file(os.path.join(bionic_libc_root, "SECCOMP_WHITELIST_SYSTEM.TXT"))
     cki.parse_file(os.path.join(bionic_libc_root, "SECCOMP_WHITELIST_GLOBAL.TXT"))
-    cki_cov.check_blacklist(cki, True)
+    registry.add_syscalls(cki.syscalls)
+    cki_cov.check_blacklist(registry, True)
   else:
-    cki_cov.get_kernel_syscalls(cki, args.arch)
-    cki_cov.check_blacklist(cki, False)
+    source = SyscallTableSource(args.kernel_dir, args.snapshot_dir,
+                                args.fetch)
+    try:
+      tables = source.read_tables([version])[version]
+    except (IOError, ValueError) as e:
+      print e
+      sys.exit(-1)
+    cki_cov.get_kernel_syscalls(registry, args.arch, tables)
+    cki_cov.check_blacklist(registry, False)
+  syscalls = registry.export()
 
   if args.l:
-    for syscall in cki.syscalls:
-      if args.arch is None or syscall[args.arch]:
+    for syscall in syscalls:
+      if args.arch is None or syscall.get(args.arch):
         print syscall["name"]
     exit(0)
 
   cki_cov.load_ltp_tests()
   cki_cov.load_ltp_disabled_tests()
-  cki_cov.match_syscalls_to_tests(cki.syscalls)
+  if args.benchmark:
+    exit(0 if cki_cov.benchmark_matchers(syscalls) else 1)
+  cki_cov.match_syscalls_to_tests(syscalls)
   cki_cov.update_test_status()
 
+  if args.t:
+    cki_cov.output_status_table()
+    exit(0)
+
   beta_string = ("*** WARNING: This script is still in development and may\n"
                  "*** report both false positives and negatives.")
   print beta_string
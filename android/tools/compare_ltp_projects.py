@@ -27,78 +27,71 @@ from __future__ import print_function
 
 import os
 import argparse
+import json
 import os.path
+import subprocess
 import sys
 
-def scan_tests(ltp_root, suite):
+import ltp_index
+import ltp_modules
+
+# Where the scan functions print their messages. main() sends them to stderr
+# when the JSON diff is written to stdout.
+message_file = sys.stdout
+
+def scan_tests(ltp_root, suite, index=None):
     ''' Find all tests that are run as part of given test suite in LTP.
 
     Args:
         ltp_root: Path ot the LTP project.
         suite: Name of testsuite.
+        index: ltp_index.LtpIndex of the project, loaded if None.
 
     Returns:
         List of tests names that are run as part of the given test suite.
     '''
 
-    tests = []
     if not suite:
-        return tests
-
-    runtest_dir = ltp_root + os.path.sep + 'runtest'
-    test_suiteFile = runtest_dir + os.path.sep + suite
-    if not os.path.isfile(test_suiteFile):
-        print ('No tests defined for suite {}',format(suite))
-        return tests
-
-    with open(test_suiteFile) as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                tests.append(line.split()[0])
-    f.close()
-    return tests
-
-def scan_test_suites(ltp_root, scenario):
+        return []
+
+    if index is None:
+        index = ltp_index.load_index(ltp_root)
+    if suite not in index.suites:
+        print ('No tests defined for suite {}'.format(suite), file=message_file)
+        return []
+    return index.tests(suite)
+
+def scan_test_suites(ltp_root, scenario, index=None):
     ''' Find all testuites and tests run as part of given LTP scenario
 
     Args:
         ltp_root: Path to the LTP project.
         scenario: name of the scenario (found in ltp_root/scenario_groups). E.g. "vts"
+        index: ltp_index.LtpIndex of the project, loaded if None.
 
     Returns:
         List of testsuite names that are run as part of given scenario (e.g. vts).
         If scenario is not specified, return all testsuites.
     '''
 
-    runtest_dir = ltp_root + os.path.sep + 'runtest'
+    runtest_dir = os.path.join(ltp_root, ltp_index.RUNTEST_DIR)
     if not os.path.isdir(runtest_dir):
-        print ('Invalid ltp_root {}, runtest directory doesnt exist'.format(ltp_root))
+        print ('Invalid ltp_root {}, runtest directory doesnt exist'.format(ltp_root), file=message_file)
         sys.exit(2)
 
-    test_suites = []
-    if scenario:
-        scenarioFile = ltp_root + os.path.sep + 'scenario_groups' + os.path.sep + scenario
-        if not os.path.isfile(scenarioFile):
-            return test_suites
-        with open(scenarioFile) as f:
-            for line in f:
-                line = line.strip()
-                if not line.startswith('#'):
-                    test_suites.append(line)
-        return test_suites
-
-    runtest_dir = ltp_root + os.path.sep + 'runtest'
-    test_suites = [f for f in os.listdir(runtest_dir) if os.path.isfile(runtest_dir + os.path.sep + f)]
+    if index is None:
+        index = ltp_index.load_index(ltp_root)
+    return index.suite_names(scenario)
 
-    return test_suites
-
-def scan_ltp(ltp_root, scenario):
+def scan_ltp(ltp_root, scenario, cache_dir=None, with_commands=False):
     ''' scan LTP project and return all tests and testuites present.
 
     Args:
         ltp_root: Path to the LTP project.
         scenario: specific scenario we want to scan. e.g. vts
+        cache_dir: directory caching the index of the project, or None.
+        with_commands: return ltp_index.TestEntry objects, with the command
+            lines of the tests, instead of test names.
 
     Returns:
         Dictionary of all LTP test names keyed by testsuite they are run as part of.
@@ -111,17 +104,64 @@ def scan_ltp(ltp_root, scenario):
     '''
 
     if not os.path.isdir(ltp_root):
-        print ('ltp_root {} does not exist'.format(ltp_root))
+        print ('ltp_root {} does not exist'.format(ltp_root), file=message_file)
+        sys.exit(1)
+
+    index = ltp_index.load_index(ltp_root, cache_dir)
+    test_suites = scan_test_suites(ltp_root, scenario, index)
+    return scan_index(index, test_suites, scenario, with_commands)
+
+def scan_git_revision(repo, revision, scenario, cache_dir=None,
+                      with_commands=False):
+    ''' scan a revision of an LTP git repository, like scan_ltp.
+
+    Only the runtest and scenario_groups blobs of the revision are read.
+
+    Args:
+        repo: Path to the LTP git repository.
+        revision: git revision, e.g. a commit id, branch or tag.
+        scenario: specific scenario we want to scan. e.g. vts
+        cache_dir: directory caching the index of the revision, or None.
+        with_commands: see scan_ltp.
+
+    Returns:
+        Dictionary of all LTP test names keyed by testsuite, see scan_ltp.
+    '''
+    try:
+        index = ltp_index.load_git_index(repo, revision, cache_dir)
+    except subprocess.CalledProcessError:
+        print ('Invalid git revision {} in {}'.format(revision, repo), file=message_file)
         sys.exit(1)
+    if not index.suites:
+        print ('Invalid revision {}, runtest directory doesnt exist'.format(revision), file=message_file)
+        sys.exit(2)
+    return scan_index(index, index.suite_names(scenario), scenario,
+                      with_commands)
+
+def scan_index(index, test_suites, scenario, with_commands=False):
+    ''' Get the tests of test suites from the index of an LTP project.
 
-    test_suites = scan_test_suites(ltp_root, scenario)
+    Args:
+        index: ltp_index.LtpIndex of the project.
+        test_suites: list of testsuite names.
+        scenario: scenario the test suites are part of, for error messages.
+        with_commands: see scan_ltp.
+
+    Returns:
+        Dictionary of all LTP test names keyed by testsuite, see scan_ltp.
+    '''
     if not test_suites:
-        print ('No Testsuites found for scenario {}'.format(scenario))
+        print ('No Testsuites found for scenario {}'.format(scenario), file=message_file)
         sys.exit(3)
 
     ltp_tests = {}
     for suite in test_suites:
-        ltp_tests[suite] = scan_tests(ltp_root, suite)
+        if suite not in index.suites:
+            print ('No tests defined for suite {}'.format(suite), file=message_file)
+        if with_commands:
+            ltp_tests[suite] = list(index.suites.get(suite, []))
+        else:
+            ltp_tests[suite] = index.tests(suite)
     return ltp_tests
 
 def show_diff(ltp_tests_1, ltp_tests_2):
@@ -185,25 +225,169 @@ def show_diff(ltp_tests_1, ltp_tests_2):
         for i in range(total_rows):
             print ('{:>{len}} {:>{len}}'.format('' if i >= len(deleted_tests) else str(deleted_tests[i]),
                                  '' if i >= len(added_tests) else str(added_tests[i]), len=width))
+
+def show_sections(sections):
+    ''' Print titled lists of lines, skipping the empty ones.
+
+    Args:
+        sections: list of (title, list of lines) tuples
+    '''
+    for title, lines in sections:
+        if lines:
+            print ('{:*^{len}}'.format(' ' + title + ' ', len=40))
+            for line in lines:
+                print (line)
+            print('')
+
+def show_command_diff(diff):
+    ''' Print the diff returned by ltp_index.diff_suites.
+
+    Args:
+        diff: dictionary of lists, see ltp_index.diff_suites
+    '''
+    show_sections([
+        ('Deleted Test Suites', diff['deleted_suites']),
+        ('Added Test Suites', diff['added_suites']),
+        ('Deleted Tests', diff['deleted_tests']),
+        ('Added Tests', diff['added_tests']),
+        ('Changed Commands', [
+            '{}.{}\n  - {}\n  + {}'.format(i['suite'], i['name'],
+                                           i['old_command'], i['new_command'])
+            for i in diff['changed_commands']]),
+        ('Moved Tests', [
+            '{}: {} -> {}{}'.format(i['name'], i['old_suite'], i['new_suite'],
+                                    '' if i['old_command'] == i['new_command']
+                                    else ' (command changed)')
+            for i in diff['moved_tests']]),
+        ('Renamed Tests', [
+            '{}.{} -> {}.{}'.format(i['suite'], i['old_name'], i['suite'],
+                                    i['new_name'])
+            for i in diff['renamed_tests']]),
+    ])
+
+def show_module_diff(diff):
+    ''' Print the diff returned by ltp_modules.diff_modules.
+
+    Args:
+        diff: dictionary of lists, see ltp_modules.diff_modules
+    '''
+    show_sections([
+        ('Added Modules', diff['added_modules']),
+        ('Removed Modules', diff['removed_modules']),
+        ('Modules To Rebuild', ['{} ({})'.format(i['module'], i['reason'])
+                                for i in diff['rebuild_modules']]),
+        ('Tests To Rerun', diff['rerun_tests']),
+        ('Tests Without Module', diff['unresolved_tests']),
+    ])
+
 def main():
     arg_parser = argparse.ArgumentParser(
         description='Diff 2 LTP projects for supported test cases')
     arg_parser.add_argument('--ltp-root1',
                             dest='ltp_root1',
-                            required=True,
                             help="LTP Root Directory before merge")
     arg_parser.add_argument('--ltp-root2',
                             dest='ltp_root2',
-                            required=True,
                             help="LTP Root Directory after merge")
+    arg_parser.add_argument('--git-repo',
+                            dest='git_repo',
+                            help="LTP git repository to compare 2 revisions "
+                                 "of, instead of 2 LTP Root Directories")
+    arg_parser.add_argument('--rev1',
+                            dest='rev1',
+                            help="git revision before merge")
+    arg_parser.add_argument('--rev2',
+                            dest='rev2',
+                            help="git revision after merge")
     arg_parser.add_argument('--scenario', default=None,
                             dest='scenario',
                             help="LTP scenario to list tests for")
+    arg_parser.add_argument('--cache-dir', default=None,
+                            dest='cache_dir',
+                            help="Directory caching the parsed runtest and "
+                                 "scenario_groups files of the projects")
+    arg_parser.add_argument('--commands', action='store_true',
+                            dest='commands',
+                            help="Also compare the command lines of the tests "
+                                 "and report changed, moved and renamed tests")
+    arg_parser.add_argument('--json', default=None,
+                            dest='json',
+                            help="Write the diff of the tests and their "
+                                 "commands to this path as JSON, - for stdout")
+    arg_parser.add_argument('--blueprint1', default=None,
+                            dest='blueprint1',
+                            help="gen.bp before merge, to report the ltp_* "
+                                 "modules added, removed or to rebuild and "
+                                 "the tests to rerun")
+    arg_parser.add_argument('--blueprint2', default=None,
+                            dest='blueprint2',
+                            help="gen.bp after merge, defaults to "
+                                 "--blueprint1")
     args = arg_parser.parse_args()
-
-    ltp_tests1 = scan_ltp(args.ltp_root1, args.scenario)
-    ltp_tests2 = scan_ltp(args.ltp_root2, args.scenario)
-    show_diff(ltp_tests1, ltp_tests2)
+    if args.json == '-':
+        global message_file
+        message_file = sys.stderr
+    with_commands = args.commands or bool(args.json) or bool(args.blueprint1)
+    if args.blueprint2 and not args.blueprint1:
+        arg_parser.error('--blueprint2 requires --blueprint1')
+
+    if args.git_repo:
+        if not args.rev1 or not args.rev2:
+            arg_parser.error('--git-repo requires --rev1 and --rev2')
+        ltp_tests1 = scan_git_revision(args.git_repo, args.rev1,
+                                       args.scenario, args.cache_dir,
+                                       with_commands)
+        ltp_tests2 = scan_git_revision(args.git_repo, args.rev2,
+                                       args.scenario, args.cache_dir,
+                                       with_commands)
+        if args.blueprint1:
+            sources1 = ltp_index.git_blob_ids(args.git_repo, args.rev1).get
+            sources2 = ltp_index.git_blob_ids(args.git_repo, args.rev2).get
+    else:
+        if not args.ltp_root1 or not args.ltp_root2:
+            arg_parser.error('--ltp-root1 and --ltp-root2 are required '
+                             'unless --git-repo is given')
+        ltp_tests1 = scan_ltp(args.ltp_root1, args.scenario, args.cache_dir,
+                              with_commands)
+        ltp_tests2 = scan_ltp(args.ltp_root2, args.scenario, args.cache_dir,
+                              with_commands)
+        sources1 = ltp_modules.directory_sources(args.ltp_root1)
+        sources2 = ltp_modules.directory_sources(args.ltp_root2)
+
+    if args.json != '-':
+        if with_commands:
+            show_diff(dict((suite, [i.name for i in entries])
+                           for suite, entries in ltp_tests1.items()),
+                      dict((suite, [i.name for i in entries])
+                           for suite, entries in ltp_tests2.items()))
+        else:
+            show_diff(ltp_tests1, ltp_tests2)
+    if not with_commands:
+        return
+
+    diff = ltp_index.diff_suites(ltp_tests1, ltp_tests2)
+    module_diff = None
+    if args.blueprint1:
+        index1 = ltp_modules.load_module_index(args.blueprint1)
+        index2 = (ltp_modules.load_module_index(args.blueprint2)
+                  if args.blueprint2 else index1)
+        module_diff = ltp_modules.diff_modules(ltp_tests1, ltp_tests2,
+                                               index1, index2,
+                                               sources1, sources2)
+        diff['modules'] = module_diff
+    if args.json == '-':
+        json.dump(diff, sys.stdout, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        print('')
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(diff, f, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+            f.write('\n')
+    if args.commands and args.json != '-':
+        show_command_diff(diff)
+    if module_diff is not None and args.json != '-':
+        show_module_diff(module_diff)
 
 if __name__ == '__main__':
     main()
@@ -24,6 +24,12 @@ CUSTOM_CFLAGS_PATH=$TOOLS_DIR/custom_cflags.json
 OUTPUT_MK=$LTP_ANDROID_DIR/Android.ltp.mk
 OUTPUT_PLIST=$LTP_ANDROID_DIR/ltp_package_list.mk
 OUTPUT_BP=$LTP_ROOT/gen.bp
+INCREMENTAL_STATE=$TOOLS_DIR/gen_android_build.state
+PARSE_CACHE_DIR=$TOOLS_DIR/parse_cache
+PROFILE_REPORT=$TOOLS_DIR/gen_android_build_profile.json
+PROFILE=""
+NATIVE=""
+GENERATOR_ARGS=""
 
 export PYTHONDONTWRITEBYTECODE=1
 
@@ -34,14 +40,45 @@ case $1 in
     echo "Update option enabled. Regenerating..."
     rm -rf *.dump
     ;;
+  -i|--incremental)
+    echo "Incremental option enabled. Only regenerating changed modules..."
+    GENERATOR_ARGS="--incremental_state $INCREMENTAL_STATE"
+    ;;
+  -n|--native)
+    echo "Native option enabled. Dumping make dry-runs on the host..."
+    NATIVE=1
+    GENERATOR_ARGS="--native"
+    ;;
+  -p|--profile)
+    echo "Profile option enabled. Writing report to $PROFILE_REPORT..."
+    PROFILE=1
+    GENERATOR_ARGS="--profile $PROFILE_REPORT"
+    ;;
   -h|--help)
     echo "Generate Android.ltp.mk / gen.bp."
     echo "Please use \"--update\" option to update and regenerate Android.ltp.mk / gen.bp."
+    echo "Please use \"--incremental\" option to only process the parts of the dumps,"
+    echo "disabled_*.txt and custom_cflags.json that changed since the last incremental run."
+    echo "Please use \"--native\" option to dump the make dry-runs on the host instead of"
+    echo "in docker. LTP_ROOT is configured if it isn't already."
+    echo "Please use \"--profile\" option to write the time and memory used by every phase"
+    echo "to $(basename $PROFILE_REPORT)."
     exit 0
     ;;
 esac
 
-if ! [ -f $TOOLS_DIR/make_dry_run.dump ]; then
+if [ -n "$NATIVE" ]; then
+  # Same check as make_native.IsConfigured.
+  if ! [ -f $LTP_ROOT/include/config.h -a -f $LTP_ROOT/include/mk/config.mk ]; then
+    echo "LTP has not been configured."
+    echo "Executing \"cd $LTP_ROOT; make autotools; ./configure\""
+    # Like dump_make_dryrun.sh, leave the source tree as it was, also when
+    # the generator fails.
+    trap "echo \"Distclean $LTP_ROOT ...\"; make -C $LTP_ROOT distclean" EXIT
+    (cd $LTP_ROOT; make autotools)
+    (cd $LTP_ROOT; ./configure)
+  fi
+elif ! [ -f $TOOLS_DIR/make_dry_run.dump ]; then
   DOCKER_USERNAME=$(id -un)
   DOCKER_UID=$(id -u)
   DOCKER_GID=$(id -g)
@@ -49,10 +86,15 @@ if ! [ -f $TOOLS_DIR/make_dry_run.dump ]; then
   echo "LTP make dry_run not dumped. Dumping..."
   echo ""
   echo "This may need your sudo password in order to access docker:"
+  DRY_RUN_START=$(date +%s.%N)
   set -x
   sudo docker build --build-arg userid=$DOCKER_UID --build-arg groupid=$DOCKER_GID --build-arg username=$DOCKER_USERNAME --build-arg ltproot=$LTP_ROOT -t android-gen-ltp .
   sudo docker run -it --rm -v $LTP_ROOT:/src -w /src/android/tools android-gen-ltp
   set +x
+  if [ -n "$PROFILE" ]; then
+    DRY_RUN_SECONDS=$(echo "$DRY_RUN_START $(date +%s.%N)" | awk '{ print $2 - $1 }')
+    GENERATOR_ARGS="$GENERATOR_ARGS --profile_dry_run_seconds $DRY_RUN_SECONDS"
+  fi
 fi
 
 cat $LTP_ANDROID_DIR/AOSP_license_text.txt > $OUTPUT_MK
@@ -72,4 +114,5 @@ echo "" >> $OUTPUT_BP
 
 python android_build_generator.py --ltp_root $LTP_ROOT --output_mk_path $OUTPUT_MK \
     --output_bp_path $OUTPUT_BP --output_plist_path $OUTPUT_PLIST \
-    --custom_cflags_file $CUSTOM_CFLAGS_PATH
+    --custom_cflags_file $CUSTOM_CFLAGS_PATH --jobs $(nproc) \
+    --parse_cache_dir $PARSE_CACHE_DIR $GENERATOR_ARGS
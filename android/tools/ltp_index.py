@@ -0,0 +1,464 @@
+#
+# Copyright 2018 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Index of the test suites and scenarios of an LTP project.
+
+The runtest/ and scenario_groups/ files of a project are parsed once into an
+LtpIndex, optionally cached on disk keyed by the modification times of the
+files. The files can also be read from a revision of a git repository, see
+load_git_index.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import os.path
+import stat
+import subprocess
+
+RUNTEST_DIR = 'runtest'
+SCENARIO_DIR = 'scenario_groups'
+
+# Files of runtest/ and scenario_groups/ which are not suites or scenarios.
+IGNORED_FILES = frozenset(['Makefile'])
+
+# Bump when the format of the cache files changes.
+CACHE_VERSION = 1
+
+
+class TestEntry(object):
+    ''' A test of a runtest file.
+
+    Attributes:
+        name: string, tag of the test, e.g. 'abort01'
+        command: string, command line running the test
+    '''
+    __slots__ = ('name', 'command')
+
+    def __init__(self, name, command):
+        self.name = name
+        self.command = command
+
+    def __eq__(self, other):
+        return (self.name, self.command) == (other.name, other.command)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'TestEntry(%r, %r)' % (self.name, self.command)
+
+
+def parse_runtest(lines):
+    ''' Parse the lines of a runtest file.
+
+    Args:
+        lines: iterable of string
+
+    Returns:
+        List of TestEntry, in file order.
+    '''
+    entries = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            fields = line.split(None, 1)
+            entries.append(TestEntry(fields[0],
+                                     fields[1] if len(fields) > 1 else ''))
+    return entries
+
+
+def parse_scenario(lines):
+    ''' Parse the lines of a scenario_groups file.
+
+    Args:
+        lines: iterable of string
+
+    Returns:
+        List of test suite names, in file order.
+    '''
+    suites = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            suites.append(line)
+    return suites
+
+
+class LtpIndex(object):
+    ''' Test suites and scenarios of an LTP project.
+
+    Attributes:
+        suites: dict of test suite name to list of TestEntry
+        scenarios: dict of scenario name to list of test suite names
+    '''
+
+    def __init__(self, suites, scenarios):
+        self.suites = suites
+        self.scenarios = scenarios
+
+    def suite_names(self, scenario=None):
+        ''' Get the test suites of a scenario.
+
+        Args:
+            scenario: name of the scenario, e.g. "vts", or None for all
+                test suites.
+
+        Returns:
+            List of test suite names, sorted for all test suites and in
+            file order for a scenario. Empty if the scenario does not exist.
+        '''
+        if scenario:
+            return list(self.scenarios.get(scenario, []))
+        return sorted(self.suites)
+
+    def tests(self, suite):
+        ''' Get the test names of a test suite, empty if it does not exist.'''
+        return [entry.name for entry in self.suites.get(suite, [])]
+
+    def to_json(self):
+        ''' Get the index as JSON serializable values.'''
+        return {
+            'suites': dict((suite, [[i.name, i.command] for i in entries])
+                           for suite, entries in self.suites.items()),
+            'scenarios': self.scenarios,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        ''' Create an index from the values returned by to_json.'''
+        return cls(dict((suite, [TestEntry(*i) for i in entries])
+                        for suite, entries in data['suites'].items()),
+                   data['scenarios'])
+
+
+def _list_files(directory):
+    ''' List the regular files of a directory with their stamps.
+
+    Returns:
+        Dictionary of file name to [mtime, size], empty if the directory does
+        not exist.
+    '''
+    stamps = {}
+    if not os.path.isdir(directory):
+        return stamps
+    for name in os.listdir(directory):
+        if name in IGNORED_FILES:
+            continue
+        st = os.stat(os.path.join(directory, name))
+        if stat.S_ISREG(st.st_mode):
+            stamps[name] = [st.st_mtime, st.st_size]
+    return stamps
+
+
+def _read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def _cache_path(cache_dir, key):
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'ltp_index_%s.json' % digest)
+
+
+def _load_cache(cache_dir, key, stamps):
+    ''' Load a cached index.
+
+    Args:
+        cache_dir: Directory caching the index, or None.
+        key: string identifying the project.
+        stamps: JSON serializable value which changes whenever the files of
+            the project do.
+
+    Returns:
+        LtpIndex, or None if it is not cached or the stamps differ.
+    '''
+    if not cache_dir:
+        return None
+    try:
+        with open(_cache_path(cache_dir, key)) as f:
+            data = json.load(f)
+        if (data.get('version') == CACHE_VERSION and
+                data.get('stamps') == stamps):
+            return LtpIndex.from_json(data['index'])
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _store_cache(cache_dir, key, stamps, index):
+    ''' Cache an index, see _load_cache.'''
+    if not cache_dir:
+        return
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    cache_path = _cache_path(cache_dir, key)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'stamps': stamps,
+                   'index': index.to_json()}, f)
+    os.rename(tmp_path, cache_path)
+
+
+def load_index(ltp_root, cache_dir=None):
+    ''' Load the index of an LTP project.
+
+    Args:
+        ltp_root: Path to the LTP project.
+        cache_dir: Directory caching the index, or None to always parse the
+            files. The cached index is used as long as no file of runtest/
+            or scenario_groups/ was added, removed or modified.
+
+    Returns:
+        LtpIndex
+    '''
+    stamps = {
+        RUNTEST_DIR: _list_files(os.path.join(ltp_root, RUNTEST_DIR)),
+        SCENARIO_DIR: _list_files(os.path.join(ltp_root, SCENARIO_DIR)),
+    }
+    key = os.path.abspath(ltp_root)
+    index = _load_cache(cache_dir, key, stamps)
+    if index is not None:
+        return index
+
+    index = LtpIndex(
+        dict((name, parse_runtest(_read_lines(
+            os.path.join(ltp_root, RUNTEST_DIR, name))))
+             for name in stamps[RUNTEST_DIR]),
+        dict((name, parse_scenario(_read_lines(
+            os.path.join(ltp_root, SCENARIO_DIR, name))))
+             for name in stamps[SCENARIO_DIR]))
+    _store_cache(cache_dir, key, stamps, index)
+    return index
+
+
+def _git(repo, args, stdin=None):
+    ''' Run a git command in a repository and get its output.
+
+    Raises:
+        subprocess.CalledProcessError: if git fails
+    '''
+    command = ['git', '-C', repo] + args
+    process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    stdout, _ = process.communicate(stdin)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode,
+                                            ' '.join(command))
+    return stdout
+
+
+def _ls_tree(repo, revision, paths, recursive=False):
+    ''' List the entries of a revision.
+
+    Returns:
+        List of (type, object id, path) tuples.
+    '''
+    output = _git(repo, ['ls-tree', '-z'] + (['-r'] if recursive else []) +
+                  [revision, '--'] + paths)
+    entries = []
+    for entry in output.decode('utf-8').split('\0'):
+        if entry:
+            info, path = entry.split('\t', 1)
+            _, object_type, object_id = info.split()
+            entries.append((object_type, object_id, path))
+    return entries
+
+
+def _cat_blobs(repo, object_ids):
+    ''' Read blobs with a single git cat-file --batch.
+
+    Returns:
+        List of the blob contents as text, in the order of object_ids.
+    '''
+    if not object_ids:
+        return []
+    output = _git(repo, ['cat-file', '--batch'],
+                  ('\n'.join(object_ids) + '\n').encode('ascii'))
+    blobs = []
+    pos = 0
+    for _ in object_ids:
+        end = output.index(b'\n', pos)
+        header = output[pos:end].split()
+        if len(header) != 3:
+            raise ValueError('git cat-file: %s' % output[pos:end])
+        size = int(header[2])
+        blobs.append(output[end + 1:end + 1 + size].decode('utf-8',
+                                                            'replace'))
+        # Skip the content and the newline following it.
+        pos = end + 1 + size + 1
+    return blobs
+
+
+def git_blob_ids(repo, revision):
+    ''' Get the object ids of all files of a revision, with one git ls-tree.
+
+    Returns:
+        Dictionary of path relative to the repository to blob id.
+    '''
+    return dict((path, object_id) for object_type, object_id, path
+                in _ls_tree(repo, revision, [], recursive=True)
+                if object_type == 'blob')
+
+
+def load_git_index(repo, revision, cache_dir=None):
+    ''' Load the index of a revision of an LTP git repository.
+
+    Only the runtest/ and scenario_groups/ blobs of the revision are read,
+    no checkout is needed.
+
+    Args:
+        repo: Path to the LTP git repository.
+        revision: git revision, e.g. a commit id, branch or tag.
+        cache_dir: Directory caching the index, or None. The cache is keyed
+            by the tree ids of runtest/ and scenario_groups/, so a revision
+            whose files did not change is loaded with a single git command.
+
+    Returns:
+        LtpIndex, empty if the revision has no runtest/ directory.
+
+    Raises:
+        subprocess.CalledProcessError: if the revision does not exist
+    '''
+    trees = dict((path, object_id) for object_type, object_id, path in
+                 _ls_tree(repo, revision, [RUNTEST_DIR, SCENARIO_DIR])
+                 if object_type == 'tree')
+    key = 'git:%s:%s' % (trees.get(RUNTEST_DIR), trees.get(SCENARIO_DIR))
+    index = _load_cache(cache_dir, key, trees)
+    if index is not None:
+        return index
+
+    blobs = [(object_id, path) for object_type, object_id, path in
+             _ls_tree(repo, revision, [RUNTEST_DIR + '/', SCENARIO_DIR + '/'])
+             if object_type == 'blob' and
+             os.path.basename(path) not in IGNORED_FILES and
+             os.path.dirname(path) in (RUNTEST_DIR, SCENARIO_DIR)]
+    contents = _cat_blobs(repo, [object_id for object_id, _ in blobs])
+    suites = {}
+    scenarios = {}
+    for (_, path), content in zip(blobs, contents):
+        directory, name = os.path.split(path)
+        if directory == RUNTEST_DIR:
+            suites[name] = parse_runtest(content.splitlines())
+        else:
+            scenarios[name] = parse_scenario(content.splitlines())
+    index = LtpIndex(suites, scenarios)
+    _store_cache(cache_dir, key, trees, index)
+    return index
+
+
+def diff_suites(suites1, suites2):
+    ''' Diff the tests of two projects, including their command lines.
+
+    Tests are matched in linear time through dictionaries keyed by suite and
+    test name, test name alone and suite and command line:
+    - tests with the same suite, name and command are unchanged,
+    - tests with the same suite and name have a changed command,
+    - tests with the same name in another suite were moved,
+    - tests with the same suite and command but another name were renamed,
+    - the other tests were deleted or added. Tests of deleted or added
+      suites are only used to find moved tests, the suites themselves are
+      reported instead.
+
+    Args:
+        suites1: dictionary of test suite name to list of TestEntry, before.
+        suites2: dictionary of test suite name to list of TestEntry, after.
+
+    Returns:
+        Dictionary of JSON serializable lists, sorted:
+            deleted_suites, added_suites: suite names
+            deleted_tests, added_tests: 'suite.name' strings
+            changed_commands: dicts with suite, name, old_command and
+                new_command
+            moved_tests: dicts with name, old_suite, new_suite, old_command
+                and new_command
+            renamed_tests: dicts with suite, old_name, new_name and command
+    '''
+    def remaining(suites, other):
+        # (suite, name, command) of the entries without an exact match in
+        # other, keeping duplicates.
+        exact = {}
+        for suite, entries in other.items():
+            for entry in entries:
+                key = (suite, entry.name, entry.command)
+                exact[key] = exact.get(key, 0) + 1
+        result = []
+        for suite in sorted(suites):
+            for entry in suites[suite]:
+                key = (suite, entry.name, entry.command)
+                if exact.get(key):
+                    exact[key] -= 1
+                else:
+                    result.append(key)
+        return result
+
+    old = remaining(suites1, suites2)
+    new = remaining(suites2, suites1)
+    matched_old = set()
+    matched_new = set()
+
+    def match(key_function, accept=None):
+        # Pair the unmatched entries of old and new with the same key.
+        index = {}
+        for j in reversed(range(len(new))):
+            if j not in matched_new:
+                index.setdefault(key_function(new[j]), []).append(j)
+        pairs = []
+        for i, entry in enumerate(old):
+            if i in matched_old:
+                continue
+            candidates = index.get(key_function(entry), [])
+            for position in reversed(range(len(candidates))):
+                j = candidates[position]
+                if accept is None or accept(entry, new[j]):
+                    del candidates[position]
+                    matched_old.add(i)
+                    matched_new.add(j)
+                    pairs.append((entry, new[j]))
+                    break
+        return pairs
+
+    changed_commands = [
+        {'suite': a[0], 'name': a[1], 'old_command': a[2],
+         'new_command': b[2]}
+        for a, b in match(lambda key: (key[0], key[1]))]
+    moved_tests = [
+        {'name': a[1], 'old_suite': a[0], 'new_suite': b[0],
+         'old_command': a[2], 'new_command': b[2]}
+        for a, b in match(lambda key: key[1], lambda a, b: a[0] != b[0])]
+    renamed_tests = [
+        {'suite': a[0], 'old_name': a[1], 'new_name': b[1], 'command': a[2]}
+        for a, b in match(lambda key: (key[0], key[2]))]
+
+    common = set(suites1).intersection(suites2)
+    return {
+        'deleted_suites': sorted(set(suites1).difference(suites2)),
+        'added_suites': sorted(set(suites2).difference(suites1)),
+        'deleted_tests': sorted('%s.%s' % (key[0], key[1])
+                                for i, key in enumerate(old)
+                                if i not in matched_old and key[0] in common),
+        'added_tests': sorted('%s.%s' % (key[0], key[1])
+                              for i, key in enumerate(new)
+                              if i not in matched_new and key[0] in common),
+        'changed_commands': sorted(changed_commands,
+                                   key=lambda i: (i['suite'], i['name'])),
+        'moved_tests': sorted(moved_tests,
+                              key=lambda i: (i['name'], i['old_suite'])),
+        'renamed_tests': sorted(renamed_tests,
+                                key=lambda i: (i['suite'], i['old_name'])),
+    }
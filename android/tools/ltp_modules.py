@@ -0,0 +1,215 @@
+#
+# Copyright 2018 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Modules of gen.bp run by the tests of an LTP project.
+
+The executables of gen.bp, the stems of its cc_test modules and the file
+names of its sh_test modules installed into testcases/bin, are indexed so
+that the command lines of the runtest files can be resolved to the ltp_*
+modules they run. diff_modules uses this to find the modules a merge adds,
+removes or changes, and the tests to rerun.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import os.path
+import re
+
+import blueprint
+
+# Directory of gen.bp installing the executables run by the runtest files.
+BIN_SUB_DIR = 'ltp/testcases/bin'
+
+# Separators of the words of a command line that may name an executable.
+COMMAND_SEPARATORS = re.compile(r'[\s;&|()<>`"\'=]+')
+
+
+class ModuleIndex(object):
+    ''' Index of the modules of a gen.bp file.
+
+    Attributes:
+        modules: dictionary of module name to blueprint.Module
+        executables: dictionary of executable name to module name
+    '''
+
+    def __init__(self, modules):
+        self.modules = {}
+        self.executables = {}
+        for module in modules:
+            name = module.Get('name')
+            self.modules[name] = module
+            if module.module_type == 'cc_test':
+                self.executables[module.Get('stem', name)] = name
+            elif (module.module_type == 'sh_test' and
+                  module.Get('sub_dir') == BIN_SUB_DIR):
+                self.executables[module.Get('filename')] = name
+
+    def resolve(self, command):
+        ''' Find the modules run by a command line.
+
+        Every word of the command naming an executable of the index is
+        taken, e.g. both the wrapper script and the binary it is passed.
+
+        Args:
+            command: string, command line of a runtest file
+
+        Returns:
+            Set of module names.
+        '''
+        modules = set()
+        for word in COMMAND_SEPARATORS.split(command):
+            name = self.executables.get(os.path.basename(word))
+            if name is not None:
+                modules.add(name)
+        return modules
+
+    def definition(self, name):
+        ''' Get how a module is built, comparable between indexes.
+
+        Returns:
+            Tuple of the module type and properties, or None if there is no
+            such module.
+        '''
+        module = self.modules.get(name)
+        if module is None:
+            return None
+        return (module.module_type,
+                tuple((prop, tuple(value) if isinstance(value, list)
+                       else value) for prop, value, _, _ in module.properties))
+
+    def sources(self, name):
+        ''' Get the source files of a module, relative to the LTP root. '''
+        module = self.modules.get(name)
+        if module is None:
+            return []
+        if module.module_type == 'sh_test':
+            return [module.Get('src')]
+        return module.Get('srcs', [])
+
+    def static_libs(self, name):
+        ''' Get the static libraries of gen.bp a module links. '''
+        module = self.modules.get(name)
+        if module is None:
+            return []
+        return [i for i in module.Get('static_libs', [])
+                if i in self.modules]
+
+
+def load_module_index(bp_path):
+    ''' Load the module index of a gen.bp file. '''
+    _, modules = blueprint.ReadModules(bp_path)
+    return ModuleIndex(modules)
+
+
+def directory_sources(ltp_root):
+    ''' Identify the source files of an LTP Root Directory by content.
+
+    Returns:
+        Function of a path relative to ltp_root returning the SHA-1 of the
+        file, or None if it doesn't exist. Files are hashed once.
+    '''
+    hashes = {}
+
+    def source_id(path):
+        if path not in hashes:
+            try:
+                with open(os.path.join(ltp_root, path), 'rb') as f:
+                    hashes[path] = hashlib.sha1(f.read()).hexdigest()
+            except IOError:
+                hashes[path] = None
+        return hashes[path]
+    return source_id
+
+
+def diff_modules(suites1, suites2, index1, index2, sources1, sources2):
+    ''' Find the modules affected by the changes between two projects.
+
+    The modules of a project are the ones its tests run. A module run by
+    both projects needs a rebuild if its gen.bp definition changed, one of
+    its sources changed, or one of the static libraries it links did. Only
+    the files listed by gen.bp are compared, not the headers they include.
+
+    Args:
+        suites1: dictionary of test suite name to list of TestEntry, before.
+        suites2: dictionary of test suite name to list of TestEntry, after.
+        index1: ModuleIndex of the gen.bp before.
+        index2: ModuleIndex of the gen.bp after, may be index1.
+        sources1: function of a source path to an id of its content, before.
+        sources2: function of a source path to an id of its content, after.
+
+    Returns:
+        Dictionary of JSON serializable lists, sorted:
+            added_modules, removed_modules: module names
+            rebuild_modules: dicts with module and reason
+            rerun_tests: 'suite.name' of the tests after the change which
+                were added or changed, or run an added or rebuilt module
+            unresolved_tests: 'suite.name' of the tests after the change
+                which run no module of index2
+    '''
+    def resolve(suites, index):
+        # (suite, name, command) of the tests to their modules.
+        return dict(((suite, entry.name, entry.command),
+                     index.resolve(entry.command))
+                    for suite, entries in suites.items()
+                    for entry in entries)
+
+    tests1 = resolve(suites1, index1)
+    tests2 = resolve(suites2, index2)
+    modules1 = set().union(*tests1.values()) if tests1 else set()
+    modules2 = set().union(*tests2.values()) if tests2 else set()
+
+    reasons = {}
+
+    def changed(name):
+        # Why a module of both projects needs a rebuild, None if it doesn't.
+        if name not in reasons:
+            reasons[name] = None
+            if index1.definition(name) != index2.definition(name):
+                reasons[name] = 'definition changed'
+            else:
+                for path in index2.sources(name):
+                    if sources1(path) != sources2(path):
+                        reasons[name] = 'source changed: %s' % path
+                        break
+            if reasons[name] is None:
+                for library in index2.static_libs(name):
+                    if changed(library):
+                        reasons[name] = 'library changed: %s' % library
+                        break
+        return reasons[name]
+
+    added = modules2.difference(modules1)
+    rebuild = [{'module': name, 'reason': changed(name)}
+               for name in sorted(modules1.intersection(modules2))
+               if changed(name)]
+    affected = added.union(i['module'] for i in rebuild)
+
+    def test_name(key):
+        return '%s.%s' % (key[0], key[1])
+
+    return {
+        'added_modules': sorted(added),
+        'removed_modules': sorted(modules1.difference(modules2)),
+        'rebuild_modules': rebuild,
+        'rerun_tests': sorted(set(test_name(key)
+                                  for key, modules in tests2.items()
+                                  if key not in tests1 or
+                                  not affected.isdisjoint(modules))),
+        'unresolved_tests': sorted(set(test_name(key)
+                                       for key, modules in tests2.items()
+                                       if not modules)),
+    }
@@ -20,54 +20,146 @@ import os
 import os.path
 import re
 import pprint
+import subprocess
+import sys
 
-# Parses the output of make install --dry-run and generates directives in the
-# form
-#
-#   install['target'] = [ 'srcfile' ]
-#
-# This output is then fed into gen_android_mk which generates Android.mk.
+import build_rules
+import make_parser
+
+# Parses the output of make install --dry-run and generates install rules
+# (build_rules.InstallRule) mapping an installed target to its prebuilt source.
 #
-# This process is split into two steps so the second step can later be replaced
-# with an Android.bp generator.
+# This output is then fed into android_build_generator which generates
+# Android.ltp.mk and gen.bp.
+
+
+def ListSourceFiles(root):
+    '''List the files of a source tree.
+
+    Uses the git index (plus untracked, not ignored files) when root is in a
+    git work tree, and a single walk of the tree otherwise.
+
+    Args:
+        root: string, root directory of the tree
+
+    Returns:
+        (files, calls) tuple, where files is a set of string, paths relative
+        to root, and calls is the number of file system calls or processes
+        used to list them
+    '''
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(
+                ['git', 'ls-files', '-z', '--cached', '--others',
+                 '--exclude-standard'], cwd=root, stderr=devnull)
+        return set(i for i in output.split('\0') if i), 1
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    files = set()
+    calls = 0
+    for path, dirs, filenames in os.walk(root):
+        calls += 1
+        relative_dir = os.path.relpath(path, root)
+        for filename in filenames:
+            if relative_dir == os.curdir:
+                files.add(filename)
+            else:
+                files.add(os.path.join(relative_dir, filename))
+    return files, calls
 
 
 class MakeInstallParser(object):
-    '''Parses the output of make install --dry-run.'''
-
-    def __init__(self, ltp_root):
+    '''Parses the output of make install --dry-run.
+
+    Attributes:
+        ltp_root: string, LTP root directory
+        use_file_index: bool, whether to check prebuilts against an index of
+            the LTP source files instead of one stat call each
+        stats_avoided: int, number of prebuilt checks answered by the index
+        index_calls: int, number of file system calls or processes used to
+            build the index
+        _real_ltp_root: string, LTP root directory with symlinks resolved
+        _pattern: compiled regex of install command lines
+        _source_files: set of string, index of the LTP source files relative
+            to LTP root, or None until first needed
+    '''
+
+    def __init__(self, ltp_root, use_file_index=True):
         self.ltp_root = ltp_root
+        self.use_file_index = use_file_index
+        self.stats_avoided = 0
+        self.index_calls = 0
+        self._real_ltp_root = os.path.realpath(ltp_root)
+        self._pattern = re.compile(
+            r'install -m \d+ "%s%s(.*)" "/opt/ltp/(.*)"' %
+            (re.escape(self._real_ltp_root), re.escape(os.sep)))
+        self._source_files = None
+
+    def IsSourceFile(self, src):
+        '''Check whether a file is in the LTP source tree.
+
+        Args:
+            src: string, path relative to LTP root
+        '''
+        if not self.use_file_index:
+            return os.path.isfile(self._real_ltp_root + os.sep + src)
+        if self._source_files is None:
+            self._source_files, self.index_calls = ListSourceFiles(
+                self._real_ltp_root)
+        self.stats_avoided += 1
+        return os.path.normpath(src) in self._source_files
 
     def ParseFile(self, input_path):
         '''Parses the text output of make install --dry-run.
 
         Args:
-            input_text: string, output of make install --dry-run
+            input_path: string, path to the output of make install --dry-run
 
         Returns:
-            string, directives in form install['target'] = [ 'srcfile' ]
+            build_rules.RuleSet, install rules keyed by target
         '''
-        pattern = re.compile(r'install -m \d+ "%s%s(.*)" "/opt/ltp/(.*)"' %
-                             (os.path.realpath(self.ltp_root), os.sep))
-        result = []
+        rule_set = build_rules.RuleSet()
+        rule_set.Extend(self.IterRules(input_path))
+        return rule_set
 
-        with open(input_path, 'r') as f:
-            for line in f:
-                line = line.strip()
+    def ParseSection(self, directory, lines):
+        '''Parse the install commands make printed in a single directory.
 
-                m = pattern.match(line)
-                if not m:
-                    continue
+        Args:
+            directory: string, the directory printed by make, or None. Install
+                commands use absolute paths so it is not needed to parse them.
+            lines: list of string, the lines of the section
 
-                src, target = m.groups()
-                # If the file isn't in the source tree, it's not a prebuilt
-                if not os.path.isfile(
-                        os.path.realpath(self.ltp_root) + os.sep + src):
-                    continue
+        Returns:
+            list of build_rules.InstallRule, in the order of the commands
+        '''
+        rules = []
+        for line in lines:
+            m = self._pattern.match(line)
+            if not m:
+                continue
+
+            src, target = m.groups()
+            # If the file isn't in the source tree, it's not a prebuilt
+            if not self.IsSourceFile(src):
+                continue
+
+            rules.append(build_rules.InstallRule(target, src))
+        return rules
+
+    def IterRules(self, input_path):
+        '''Parses the text output of make install --dry-run.
 
-                result.append("install['%s'] = ['%s']" % (target, src))
+        Args:
+            input_path: string, path to the output of make install --dry-run
 
-        return result
+        Yields:
+            build_rules.InstallRule, in the order they appear in the file
+        '''
+        for directory, lines in make_parser.SplitSections(input_path):
+            for rule in self.ParseSection(directory, lines):
+                yield rule
 
 def main():
     arg_parser = argparse.ArgumentParser(
@@ -82,12 +174,23 @@ def main():
         dest='input_path',
         required=True,
         help='Path to LTP make install --dry-run output file')
+    arg_parser.add_argument(
+        '--no-file-index',
+        dest='use_file_index',
+        action='store_false',
+        help='Stat each prebuilt instead of indexing the LTP source files')
     args = arg_parser.parse_args()
 
-    make_install_parser = MakeInstallParser(args.ltp_root)
-    result = make_install_parser.ParseFile(args.input_path)
+    make_install_parser = MakeInstallParser(args.ltp_root,
+                                            args.use_file_index)
+    result = make_install_parser.ParseFile(args.input_path).Directives()
 
     print pprint.pprint(result)
+    if args.use_file_index:
+        print >> sys.stderr, (
+            'Prebuilt checks: %d stats avoided with an index built from %d '
+            'file system calls' % (make_install_parser.stats_avoided,
+                                   make_install_parser.index_calls))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Dry-run dumps of the LTP build generated on the host, one 'make --dry-run'
+# per directory run in parallel, instead of a single recursive make in
+# docker (see dump_make_dryrun.sh).
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+TRUNK_MAKEFILE = 'generic_trunk_target.mk'
+
+# Goal of the makefile added to trunk Makefiles to list their SUBDIRS.
+SUBDIRS_GOAL = 'ltp-native-subdirs'
+SUBDIRS_MAKEFILE = '%s:\n\t@echo $(SUBDIRS)\n' % SUBDIRS_GOAL
+
+# make arguments of the dry-run of every directory, for the 'make' and the
+# 'make install' dumps. Trunk directories only run their own part of the
+# recursive goals, their SUBDIRS are dry-run on their own. The install rules
+# are only defined when 'install' is one of the goals, see env_post.mk.
+LEAF_GOALS = (['all'], ['install'])
+TRUNK_GOALS = (['trunk-all'], ['trunk-install', 'MAKECMDGOALS=install'])
+
+
+def IsConfigured(ltp_root):
+    '''Whether configure was run in the LTP tree, which make requires.'''
+    return (os.path.isfile(os.path.join(ltp_root, 'include', 'config.h')) and
+            os.path.isfile(os.path.join(ltp_root, 'include', 'mk',
+                                        'config.mk')))
+
+
+def IsTrunk(directory):
+    '''Whether the Makefile of a directory recurses into SUBDIRS.'''
+    with open(os.path.join(directory, 'Makefile')) as f:
+        return TRUNK_MAKEFILE in f.read()
+
+
+def _MakeEnvironment():
+    # Don't inherit the flags of a make this script may be running under.
+    env = dict(os.environ)
+    for name in ('MAKEFLAGS', 'MAKELEVEL', 'MFLAGS'):
+        env.pop(name, None)
+    return env
+
+
+class NativeDryRun(object):
+    '''Runs make --dry-run over the LTP testcases on the host.
+
+    Directories are visited like the recursive make does: a trunk directory
+    first runs its own targets, then its SUBDIRS in order. Every directory
+    is dry-run on its own with 'make -w', so the output has the same
+    'Entering directory' sections as the recursive make and the dumps can be
+    parsed by make_parser and make_install_parser as usual.
+
+    Leaf directories are dry-run with their 'all' and 'install' goals. Trunk
+    directories are dry-run with 'trunk-all' and 'trunk-install', which skip
+    the recursion: the recursive goals of a trunk Makefile error out when
+    SUBDIRS is empty, so SUBDIRS can't be overridden instead. See
+    TRUNK_GOALS.
+
+    Attributes:
+        ltp_root: string, LTP root directory, which must be configured
+        jobs: int, number of make processes run at once
+        directories: int, number of directories dry-run by the last Run
+        make_calls: int, number of make processes started by the last Run
+    '''
+
+    def __init__(self, ltp_root, jobs=1):
+        self.ltp_root = ltp_root
+        self.jobs = jobs
+        self.directories = 0
+        self.make_calls = 0
+        self._env = _MakeEnvironment()
+
+    def _Make(self, directory, args):
+        self.make_calls += 1
+        process = subprocess.Popen(['make', '-C', directory] + args,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, env=self._env)
+        stdout, stderr = process.communicate()
+        if process.returncode:
+            sys.stderr.write(stderr)
+            raise subprocess.CalledProcessError(
+                process.returncode, 'make -C %s %s' % (directory,
+                                                       ' '.join(args)))
+        return stdout
+
+    def _ListSubdirs(self, directory, subdirs_makefile):
+        '''Get the SUBDIRS of a trunk directory.'''
+        output = self._Make(directory, ['-s', '--no-print-directory',
+                                        '-f', 'Makefile',
+                                        '-f', subdirs_makefile,
+                                        SUBDIRS_GOAL])
+        return [os.path.join(directory, i) for i in output.split()]
+
+    def ListDirectories(self, pool, top):
+        '''List the directories make visits from top, in make order.
+
+        Args:
+            pool: ThreadPool to list SUBDIRS of trunk directories with
+            top: string, directory to start from
+
+        Returns:
+            list of (directory, is_trunk) tuples
+        '''
+        fd, subdirs_makefile = tempfile.mkstemp(suffix='.mk')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(SUBDIRS_MAKEFILE)
+
+            # Visit the tree a level at a time, listing the SUBDIRS of all
+            # trunk directories of a level in parallel.
+            children = {}
+            is_trunk = {top: IsTrunk(top)}
+            level = [top]
+            while level:
+                trunks = [i for i in level if is_trunk[i]]
+                subdirs = pool.map(
+                    lambda i: self._ListSubdirs(i, subdirs_makefile), trunks)
+                level = []
+                for trunk, dirs in zip(trunks, subdirs):
+                    children[trunk] = dirs
+                    for i in dirs:
+                        is_trunk[i] = IsTrunk(i)
+                    level.extend(dirs)
+        finally:
+            os.remove(subdirs_makefile)
+
+        result = []
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            result.append((directory, is_trunk[directory]))
+            stack.extend(reversed(children.get(directory, [])))
+        return result
+
+    def _DryRun(self, item):
+        directory, goals = item
+        return self._Make(directory, ['-w', '--dry-run'] + goals)
+
+    def Run(self, make_output_path, install_output_path):
+        '''Write the dry-run dumps of the testcases.
+
+        Args:
+            make_output_path: string, path of the 'make --dry-run' dump
+            install_output_path: string, path of the 'make install --dry-run'
+                dump
+        '''
+        self.make_calls = 0
+        pool = ThreadPool(self.jobs)
+        try:
+            directories = self.ListDirectories(
+                pool, os.path.join(self.ltp_root, 'testcases'))
+            self.directories = len(directories)
+            for index, output_path in enumerate((make_output_path,
+                                                 install_output_path)):
+                goals = [(directory,
+                          TRUNK_GOALS[index] if trunk else LEAF_GOALS[index])
+                         for directory, trunk in directories]
+                with open(output_path, 'w') as f:
+                    for output in pool.imap(self._DryRun, goals):
+                        f.write(output)
+        finally:
+            pool.close()
+            pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Dump make --dry-run of the LTP testcases on the host')
+    parser.add_argument(
+        '--ltp_root', dest='ltp_root', required=True,
+        help='LTP root dir, configure must have been run in it')
+    parser.add_argument(
+        '--make_output_path', dest='make_output_path', required=True,
+        help='output path of the make --dry-run dump')
+    parser.add_argument(
+        '--install_output_path', dest='install_output_path', required=True,
+        help='output path of the make install --dry-run dump')
+    parser.add_argument(
+        '--jobs', dest='jobs', type=int, default=1,
+        help='number of make processes run at once')
+    args = parser.parse_args()
+
+    if not IsConfigured(args.ltp_root):
+        sys.exit('%s is not configured, run "make autotools; ./configure" '
+                 'in it first' % args.ltp_root)
+    dry_run = NativeDryRun(args.ltp_root, args.jobs)
+    dry_run.Run(args.make_output_path, args.install_output_path)
+    print 'Dry-run %d directories with %d make calls' % (
+        dry_run.directories, dry_run.make_calls)
+
+
+if __name__ == '__main__':
+    main()
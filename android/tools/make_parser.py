@@ -20,11 +20,178 @@ import os.path
 import sys
 import re
 import fileinput
+import multiprocessing
 import pprint
+import time
+
+import build_rules
 
 AR = 'ar'
 CC = 'gcc'
 
+ENTERING_DIRECTORY = re.compile(r"make.*: Entering directory [`,'](.*)'")
+LEAVING_DIRECTORY = re.compile(r"make.*: Leaving directory [`,'](.*)'")
+
+# Maximum number of resolved paths MakeParser keeps; the cache is emptied
+# when it fills up.
+PATH_CACHE_SIZE = 1 << 16
+
+# gcc options which take a value, either attached (-DFOO) or as the next
+# argument (-D FOO), mapped to the CcRule field they end up in.
+CC_VALUE_OPTIONS = {
+    'D': 'defines',
+    'I': 'includes',
+    'l': 'libraries',
+    'o': 'target',
+}
+
+def SplitSections(input_path):
+    '''Split the output of make into per-directory sections.
+
+    A section is a run of consecutive lines printed while make was in a
+    given directory, i.e. between two 'Entering directory' or
+    'Leaving directory' messages. Nested directories get their own sections.
+
+    Args:
+        input_path: string, path to the output of make --dry-run
+
+    Yields:
+        (directory, lines) tuples in file order, where directory is the path
+        printed by make (None before the first 'Entering directory') and
+        lines is a list of stripped, non-empty lines
+    '''
+    dir_stack = []
+    lines = []
+
+    with open(input_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith('make'):
+                m = ENTERING_DIRECTORY.match(line)
+                if m:
+                    if lines:
+                        yield dir_stack[-1] if dir_stack else None, lines
+                        lines = []
+                    dir_stack.append(m.group(1))
+                    continue
+                if LEAVING_DIRECTORY.match(line):
+                    if lines:
+                        yield dir_stack[-1] if dir_stack else None, lines
+                        lines = []
+                    dir_stack.pop()
+                    continue
+
+            lines.append(line)
+
+    if lines:
+        yield dir_stack[-1] if dir_stack else None, lines
+
+# Parser used by the worker processes of ParseSections, see _InitWorker.
+_worker_parser = None
+
+def _InitWorker(parser_class, ltp_root):
+    '''Create the parser of a ParseSections worker process.
+
+    Args:
+        parser_class: MakeParser or make_install_parser.MakeInstallParser
+        ltp_root: string, LTP root directory
+    '''
+    global _worker_parser
+    _worker_parser = parser_class(ltp_root)
+
+def _ParseSectionInWorker(section):
+    '''Parse a section in a ParseSections worker process.
+
+    Args:
+        section: (directory, lines) tuple, as yielded by SplitSections
+
+    Returns:
+        list of rules in build_rules.RuleToJson form
+    '''
+    directory, lines = section
+    return [build_rules.RuleToJson(rule)
+            for rule in _worker_parser.ParseSection(directory, lines)]
+
+def ParseSections(parser, sections, jobs=1):
+    '''Parse sections of make output, optionally in a pool of processes.
+
+    Sections are independent of each other, so they can be parsed in any
+    order. The results are returned in the order of the sections, which
+    makes the merged rules identical to those of a serial parse.
+
+    Args:
+        parser: MakeParser or make_install_parser.MakeInstallParser
+        sections: list of (directory, lines) tuples, as yielded by
+            SplitSections
+        jobs: int, number of processes to use, 1 to parse in this process
+
+    Yields:
+        list of rules for each section, in the order of sections
+    '''
+    if jobs <= 1 or len(sections) <= 1:
+        for directory, lines in sections:
+            yield parser.ParseSection(directory, lines)
+        return
+
+    pool = multiprocessing.Pool(jobs, _InitWorker,
+                                (type(parser), parser.ltp_root))
+    try:
+        chunksize = max(1, len(sections) // (jobs * 4))
+        for data in pool.imap(_ParseSectionInWorker, sections, chunksize):
+            yield [build_rules.RuleFromJson(i) for i in data]
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def Tokenize(line):
+    '''Split a shell command line into arguments.
+
+    Arguments are separated by unquoted whitespace. Quote characters are kept
+    in the arguments so that they are passed through verbatim, e.g.
+    -DFOO="bar baz" is a single argument.
+
+    Args:
+        line: string, a command line
+
+    Returns:
+        list of string, the arguments of the command line
+    '''
+    tokens = []
+    token = []
+    quote = None
+    i = 0
+    length = len(line)
+    while i < length:
+        c = line[i]
+        if quote:
+            token.append(c)
+            if c == quote:
+                quote = None
+            elif c == '\\' and quote == '"' and i + 1 < length:
+                i += 1
+                token.append(line[i])
+        elif c in ' \t\n':
+            if token:
+                tokens.append(''.join(token))
+                token = []
+        else:
+            token.append(c)
+            if c == '"' or c == "'":
+                quote = c
+            elif c == '\\' and i + 1 < length:
+                i += 1
+                token.append(line[i])
+        i += 1
+    if token:
+        tokens.append(''.join(token))
+    return tokens
+
 class MakeParser(object):
     '''Parses the output of make --dry-run.
 
@@ -32,11 +199,18 @@ class MakeParser(object):
         ltp_root: string, LTP root directory
         ar_parser: archive (ar) command argument parser
         cc_parser: gcc command argument parser
-        result: list of string, result string buffer
+        result: list of string, result string buffer of ParseFileWithArgparse
         dir_stack: list of string, directory stack for parsing make commands
+        path_cache_hits: int, number of GetRelativePath calls answered from
+            the path cache
+        path_cache_misses: int, number of GetRelativePath calls which had to
+            resolve the path on the file system
+        _path_cache: dict of (string, string) to string, relative paths keyed
+            by the current directory and the path as written in the command
+        _path_cache_size: int, maximum number of entries in _path_cache
     '''
 
-    def __init__(self, ltp_root):
+    def __init__(self, ltp_root, path_cache_size=PATH_CACHE_SIZE):
         self.ltp_root = ltp_root
         ar_parser = argparse.ArgumentParser()
         ar_parser.add_argument('-r', dest='r', action='store_true')
@@ -54,18 +228,42 @@ class MakeParser(object):
         self.result = []
         self.dir_stack = []
 
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+        self._path_cache = {}
+        self._path_cache_size = path_cache_size
+
     def GetRelativePath(self, path):
         '''Get relative path toward LTP directory.
 
+        Resolved paths are cached, so the file system is only hit once for
+        each path relative to a given directory.
+
         Args:
             path: string, a path to convert to relative path
         '''
+        if path[0] == '/':
+            key = (None, path)
+        else:
+            key = (self.dir_stack[-1], path)
+
+        relative_path = self._path_cache.get(key)
+        if relative_path is not None:
+            self.path_cache_hits += 1
+            return relative_path
+        self.path_cache_misses += 1
+
         if path[0] == '/':
             path = os.path.realpath(path)
         else:
             path = os.path.realpath(self.ltp_root + os.sep + self.dir_stack[-1]
                                     + os.sep + path)
-        return os.path.realpath(path).replace(self.ltp_root + os.sep, '')
+        relative_path = path.replace(self.ltp_root + os.sep, '')
+
+        if len(self._path_cache) >= self._path_cache_size:
+            self._path_cache.clear()
+        self._path_cache[key] = relative_path
+        return relative_path
 
     def GetRelativePathForExtensions(self, paths, extensions):
         '''Get relative path toward LTP directory of paths with given extension.
@@ -141,11 +339,175 @@ class MakeParser(object):
         self.result.append("cc_flags['%s'] = %s" % (target, flags))
         self.result.append("cc_includes['%s'] = %s" % (target, includes))
 
+    def ParseArTokens(self, tokens):
+        '''Parse the arguments of an archive command line.
+
+        Understands the same options as ar_parser: a leading option cluster
+        containing 'r' and/or 'c', where 'c' takes the archive path either
+        attached to the cluster or as the next argument.
+
+        Args:
+            tokens: list of string, arguments of the ar command line
+
+        Returns:
+            ArRule
+        '''
+        r = False
+        c = None
+        unparsed = []
+        i = 1
+        count = len(tokens)
+        while i < count:
+            token = tokens[i]
+            i += 1
+            if (token[:1] == '-' and len(token) > 1 and token[1] in 'rc' and
+                    c is None):
+                for j in range(1, len(token)):
+                    if token[j] == 'r':
+                        r = True
+                    elif token[j] == 'c':
+                        c = token[j + 1:]
+                        if not c and i < count:
+                            c = tokens[i]
+                            i += 1
+                        break
+                    else:
+                        break
+                continue
+            unparsed.append(token)
+
+        sources = self.GetRelativePathForExtensions(unparsed, ['o'])
+
+        target = None
+        if not c and not r:
+            for path in unparsed:
+                if path.endswith('.a'):
+                    target = self.GetRelativePath(path)
+                    break
+        else:
+            target = self.GetRelativePath(c.replace('"', ""))
+
+        assert len(sources) > 0
+        assert target != None
+
+        return build_rules.ArRule(target, sources)
+
+    def ParseCcTokens(self, tokens):
+        '''Parse the arguments of a gcc command line.
+
+        Understands the same options as cc_parser, see CC_VALUE_OPTIONS.
+
+        Args:
+            tokens: list of string, arguments of the gcc command line
+
+        Returns:
+            CcRule
+        '''
+        values = {'defines': [], 'includes': [], 'libraries': []}
+        target = None
+        compile = False
+        unparsed = []
+        i = 1
+        count = len(tokens)
+        while i < count:
+            token = tokens[i]
+            i += 1
+            if token[:1] != '-' or len(token) < 2:
+                unparsed.append(token)
+                continue
+            dest = CC_VALUE_OPTIONS.get(token[1])
+            if dest is not None:
+                value = token[2:]
+                if not value and i < count:
+                    value = tokens[i]
+                    i += 1
+                if dest == 'target':
+                    target = value
+                else:
+                    values[dest].append(value)
+            elif token == '-c':
+                compile = True
+            else:
+                unparsed.append(token)
+
+        sources = self.GetRelativePathForExtensions(unparsed, ['c', 'o'])
+        includes = [self.GetRelativePath(i) for i in values['includes']]
+        flags = ['-D%s' % define for define in values['defines']]
+        flags.extend(i for i in unparsed if i.startswith('-Wno'))
+        target = self.GetRelativePath(target)
+
+        assert len(sources) > 0
+
+        if compile:
+            return build_rules.CcRule(target, 'compile', sources, flags,
+                                      includes, [])
+        if sources[0].endswith('.o'):
+            kind = 'link'
+        else:
+            kind = 'compilelink'
+        return build_rules.CcRule(target, kind, sources, flags, includes,
+                                  values['libraries'])
+
+    def ParseSection(self, directory, lines):
+        '''Parse the commands make printed in a single directory.
+
+        Args:
+            directory: string, the directory printed by make, or None
+            lines: list of string, the lines of the section
+
+        Returns:
+            list of ArRule or CcRule, in the order of the commands
+        '''
+        if directory is None:
+            self.dir_stack = []
+        else:
+            self.dir_stack = [self.GetRelativePath(directory)]
+
+        rules = []
+        for line in lines:
+            if line.startswith(AR):
+                rules.append(self.ParseArTokens(Tokenize(line)))
+            elif line.startswith(CC):
+                rules.append(self.ParseCcTokens(Tokenize(line)))
+        return rules
+
+    def IterRules(self, input_path):
+        '''Parses the output of make --dry-run in a single streaming pass.
+
+        Unlike ParseFileWithArgparse, each command line is tokenized once with
+        Tokenize instead of going through argparse.
+
+        Args:
+            input_path: string, path to the output of make --dry-run
+
+        Yields:
+            ArRule or CcRule, in the order the commands appear in the file
+        '''
+        for directory, lines in SplitSections(input_path):
+            for rule in self.ParseSection(directory, lines):
+                yield rule
+
     def ParseFile(self, input_path):
         '''Parses the output of make --dry-run.
 
         Args:
-            input_text: string, output of make --dry-run
+            input_path: string, path to the output of make --dry-run
+
+        Returns:
+            build_rules.RuleSet, ar and gcc rules keyed by target
+        '''
+        rule_set = build_rules.RuleSet()
+        rule_set.Extend(self.IterRules(input_path))
+        return rule_set
+
+    def ParseFileWithArgparse(self, input_path):
+        '''Parses the output of make --dry-run with argparse.
+
+        This is the original, slower parser. It is kept to check the
+        streaming parser against, see Benchmark.
+
+        Args:
+            input_path: string, path to the output of make --dry-run
 
         Returns:
             string, generated directives in the form
@@ -161,19 +523,16 @@ class MakeParser(object):
         self.result = []
         self.dir_stack = []
 
-        entering_directory = re.compile(r"make.*: Entering directory [`,'](.*)'")
-        leaving_directory = re.compile(r"make.*: Leaving directory [`,'](.*)'")
-
         with open(input_path, 'r') as f:
             for line in f:
                 line = line.strip()
 
-                m = entering_directory.match(line)
+                m = ENTERING_DIRECTORY.match(line)
                 if m:
                     self.dir_stack.append(self.GetRelativePath(m.group(1)))
                     continue
 
-                m = leaving_directory.match(line)
+                m = LEAVING_DIRECTORY.match(line)
                 if m:
                     self.dir_stack.pop()
                 elif line.startswith(AR):
@@ -183,6 +542,57 @@ class MakeParser(object):
 
         return self.result
 
+def Benchmark(ltp_root, input_path, iterations):
+    '''Compare the argparse and the streaming parser on a recorded dump.
+
+    Args:
+        ltp_root: string, LTP root directory
+        input_path: string, path to LTP make --dry-run output file
+        iterations: int, number of times each parser is run
+    '''
+    with open(input_path, 'r') as f:
+        line_count = sum(1 for _ in f)
+
+    timings = {}
+    results = {}
+    for name in ('argparse', 'streaming'):
+        best = None
+        for _ in range(iterations):
+            make_parser = MakeParser(ltp_root)
+            start = time.time()
+            if name == 'argparse':
+                result = make_parser.ParseFileWithArgparse(input_path)
+            else:
+                result = []
+                for rule in make_parser.IterRules(input_path):
+                    result.extend(rule.Directives())
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        timings[name] = best
+        results[name] = result
+        if name == 'streaming':
+            print 'path cache: %d hits, %d misses' % (
+                make_parser.path_cache_hits, make_parser.path_cache_misses)
+
+    for name in ('argparse', 'streaming'):
+        print '%-10s %8.3fs %10.0f lines/s %8d directives' % (
+            name, timings[name], line_count / max(timings[name], 1e-9),
+            len(results[name]))
+    print 'speedup: %.2fx' % (timings['argparse'] /
+                              max(timings['streaming'], 1e-9))
+
+    mismatches = [(a, b) for a, b in zip(results['argparse'],
+                                         results['streaming']) if a != b]
+    if (mismatches or
+            len(results['argparse']) != len(results['streaming'])):
+        print 'WARNING: %d directives differ between the two parsers' % (
+            len(mismatches) +
+            abs(len(results['argparse']) - len(results['streaming'])))
+        for a, b in mismatches[:10]:
+            print '  argparse:  %s' % a
+            print '  streaming: %s' % b
+
 def main():
     arg_parser = argparse.ArgumentParser(
         description='Parse the LTP make --dry-run output into a list')
@@ -196,10 +606,29 @@ def main():
         dest='input_path',
         required=True,
         help='Path to LTP make --dry-run output file')
+    arg_parser.add_argument(
+        '--argparse',
+        dest='argparse',
+        action='store_true',
+        help='Use the original argparse parser instead of the tokenizer')
+    arg_parser.add_argument(
+        '--benchmark',
+        dest='benchmark',
+        type=int,
+        default=0,
+        metavar='ITERATIONS',
+        help='Time the argparse and streaming parsers on the dry-run file')
     args = arg_parser.parse_args()
 
+    if args.benchmark:
+        Benchmark(args.ltp_root, args.input_path, args.benchmark)
+        return
+
     make_parser = MakeParser(args.ltp_root)
-    result = make_parser.ParseFile(args.input_path)
+    if args.argparse:
+        result = make_parser.ParseFileWithArgparse(args.input_path)
+    else:
+        result = make_parser.ParseFile(args.input_path).Directives()
 
     print pprint.pprint(result)
 
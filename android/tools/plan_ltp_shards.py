@@ -0,0 +1,180 @@
+#! /usr/bin/env python
+#
+# Copyright 2018 - The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import print_function
+
+"""Tool for splitting the tests of LTP suites into shards of equal run time"""
+
+import argparse
+import heapq
+import os
+import os.path
+import re
+import sys
+
+import ltp_index
+
+# Fields of the ltp-pan logs: 'tag=abort01 stime=... dur=0 exit=...' lines
+# of the -l log, 'tag=abort01 stime=...' then 'duration=0 ...' lines of the
+# -o output.
+TAG_FIELD = re.compile(r'(?:^|\s)tag=(\S+)')
+DURATION_FIELD = re.compile(r'(?:^|\s)(?:dur|duration)=(\d+)')
+
+def parse_durations(lines, durations=None):
+    ''' Collect the durations of the tests of an ltp-pan log.
+
+    Args:
+        lines: lines of the log.
+        durations: dictionary of test name to list of durations to add to,
+            or None for a new one.
+
+    Returns:
+        Dictionary of test name to list of durations in seconds.
+    '''
+    if durations is None:
+        durations = {}
+    tag = None
+    for line in lines:
+        m = TAG_FIELD.search(line)
+        if m:
+            tag = m.group(1)
+        m = DURATION_FIELD.search(line)
+        if m and tag is not None:
+            durations.setdefault(tag, []).append(int(m.group(1)))
+            tag = None
+    return durations
+
+def plan_shards(tests, durations, shards, default_duration):
+    ''' Split tests into shards of about the same total duration.
+
+    Tests are assigned longest first to the shard with the least total
+    duration so far. Tests keep their relative order within a shard.
+
+    Args:
+        tests: list of (suite, TestEntry) tuples, in run order.
+        durations: dictionary of test name to duration in seconds.
+        shards: number of shards.
+        default_duration: duration of the tests missing from durations.
+
+    Returns:
+        List of (total duration, list of (suite, TestEntry)) tuples, one per
+        shard.
+    '''
+    def duration(position):
+        return durations.get(tests[position][1].name, default_duration)
+
+    order = sorted(range(len(tests)), key=lambda i: (-duration(i), i))
+    loads = [(0, shard) for shard in range(shards)]
+    assigned = [[] for _ in range(shards)]
+    for position in order:
+        load, shard = heapq.heappop(loads)
+        assigned[shard].append(position)
+        heapq.heappush(loads, (load + duration(position), shard))
+    return [(sum(duration(i) for i in positions),
+             [tests[i] for i in sorted(positions)])
+            for positions in assigned]
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Split the tests of LTP suites into runtest files of '
+                    'about the same run time, using the durations of '
+                    'previous runs')
+    arg_parser.add_argument('--ltp-root', required=True,
+                            dest='ltp_root',
+                            help="LTP Root Directory")
+    arg_parser.add_argument('--scenario', default=None,
+                            dest='scenario',
+                            help="LTP scenario to plan the suites of")
+    arg_parser.add_argument('--suite', action='append', default=[],
+                            dest='suites',
+                            help="Test suite to plan, can be repeated, "
+                                 "instead of a scenario")
+    arg_parser.add_argument('--results', action='append', default=[],
+                            dest='results',
+                            help="ltp-pan log (runltp -l or -o) of a "
+                                 "previous run, can be repeated")
+    arg_parser.add_argument('--shards', type=int, required=True,
+                            dest='shards',
+                            help="Number of devices or CPUs to run on")
+    arg_parser.add_argument('--output-dir', required=True,
+                            dest='output_dir',
+                            help="Directory to write the shard runtest "
+                                 "files to")
+    arg_parser.add_argument('--prefix', default='shard',
+                            dest='prefix',
+                            help="Name prefix of the shard runtest files")
+    arg_parser.add_argument('--default-duration', type=int, default=None,
+                            dest='default_duration',
+                            help="Duration in seconds of the tests without "
+                                 "results, the median duration by default")
+    arg_parser.add_argument('--cache-dir', default=None,
+                            dest='cache_dir',
+                            help="Directory caching the parsed runtest and "
+                                 "scenario_groups files of the project")
+    args = arg_parser.parse_args()
+    if args.shards < 1:
+        arg_parser.error('--shards must be at least 1')
+    if args.scenario and args.suites:
+        arg_parser.error('--scenario and --suite are exclusive')
+
+    index = ltp_index.load_index(args.ltp_root, args.cache_dir)
+    suites = args.suites or index.suite_names(args.scenario)
+    if not suites:
+        print('No test suites found for scenario {}'.format(args.scenario))
+        sys.exit(3)
+    tests = []
+    for suite in suites:
+        if suite not in index.suites:
+            print('No tests defined for suite {}'.format(suite))
+            continue
+        tests.extend((suite, entry) for entry in index.suites[suite])
+
+    observed = {}
+    for path in args.results:
+        with open(path) as f:
+            parse_durations(f, observed)
+    # The mean of all runs of a test.
+    durations = dict((name, float(sum(values)) / len(values))
+                     for name, values in observed.items())
+    default_duration = args.default_duration
+    if default_duration is None:
+        known = sorted(durations.values())
+        default_duration = known[len(known) // 2] if known else 1
+
+    plan = plan_shards(tests, durations, args.shards, default_duration)
+
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    width = len(str(args.shards - 1))
+    print('{:<24} {:>8} {:>12}'.format('shard', 'tests', 'duration (s)'))
+    for number, (total, shard_tests) in enumerate(plan):
+        name = '{}{:0{width}}'.format(args.prefix, number, width=width)
+        with open(os.path.join(args.output_dir, name), 'w') as f:
+            for suite, entry in shard_tests:
+                f.write('{} {}\n'.format(entry.name, entry.command))
+        print('{:<24} {:>8} {:>12.0f}'.format(name, len(shard_tests), total))
+
+    missing = sum(1 for _, entry in tests if entry.name not in durations)
+    total = sum(i[0] for i in plan)
+    print('total {:.0f}s, ideal {:.0f}s per shard, longest shard {:.0f}s'
+          .format(total, total / args.shards, max(i[0] for i in plan)))
+    if missing:
+        print('{} of {} tests had no result and were assumed to take {}s'
+              .format(missing, len(tests), default_duration))
+
+if __name__ == '__main__':
+    main()